@@ -1,19 +1,60 @@
+import os
+import click
 from flask import Flask
-from .config import Config
-from .extensions import db, migrate, jwt, ma
+from .config import configs
+from .extensions import db, jwt
+from .database import add_read_bind, apply_pragmas
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    app.config.from_object(config_class or configs[os.getenv('APP_ENV', 'development')])
+
+    if app.config['JSON_PROVIDER'] == 'orjson':
+        from .json_provider import OrjsonProvider, orjson
+        if orjson is None:
+            app.logger.warning("JSON_PROVIDER=orjson but orjson is not installed, using the default provider")
+        else:
+            app.json = OrjsonProvider(app)
 
     # Initialize extensions
+    add_read_bind(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    with app.app_context():
+        apply_pragmas(app, db.engines)
     jwt.init_app(app)
-    ma.init_app(app)
+    # Flask-Migrate imports Alembic, a fifth of the cold start: only set it up
+    # when the app is loaded by the `flask` CLI (which provides `flask db`)
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from . import cache
+    from .jobs import jobs
+    from .instrumentation import instrumentation
+    from .hashing import password_hasher
+    from .submissions import submission_writer
+    from .broker import broker
+    from .idempotency import idempotent
+    from .response_cache import response_cache
+    cache.init_app(app)
+    idempotent.init_app(app)
+    broker.init_app(app)
+    jobs.init_app(app)
+    password_hasher.init_app(app)
+    submission_writer.init_app(app)
+    instrumentation.init_app(app)
+    # After instrumentation: its hit rates are exported at /metrics
+    response_cache.init_app(app)
 
     # Register blueprints (we will create these later)
     from .routes import main_bp
     app.register_blueprint(main_bp)
 
+    from .stats import stats_cli
+    from .deletion import trivias_cli
+    from .database import schema_cli
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(trivias_cli)
+    app.cli.add_command(schema_cli)
+
     return app
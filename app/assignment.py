@@ -0,0 +1,86 @@
+from datetime import datetime
+from .extensions import db
+from .models import User, Question, TriviaQuestion, TriviaParticipation
+from .cache import assignments
+
+
+def _insert_ignore(model):
+    # Re-assigning an existing (trivia, user) or (trivia, question) pair is a no-op
+    return db.insert(model.__table__).prefix_with('OR IGNORE', dialect='sqlite')
+
+
+PARTICIPATION_COLUMNS = ['trivia_id', 'user_id', 'score', 'completed', 'started_at', 'question_id_limit']
+
+
+def _new_participations(trivia_id, started_at):
+    # Pins the sampling pools: questions created later never enter the participation's draw
+    question_id_limit = db.session.scalar(db.select(db.func.max(Question.id)))
+    return db.select(
+        db.literal(trivia_id), User.id, db.literal(0), db.literal(False), db.literal(started_at),
+        db.literal(question_id_limit, db.Integer)
+    )
+
+
+# INSERT ... SELECT from the parent table: unknown ids are skipped instead of
+# failing on the foreign keys (OR IGNORE does not cover those)
+
+def assign_questions(trivia_id, question_ids):
+    question_ids = list(dict.fromkeys(question_ids))
+    if question_ids:
+        db.session.execute(_insert_ignore(TriviaQuestion).from_select(
+            ['trivia_id', 'question_id'],
+            db.select(db.literal(trivia_id), Question.id).where(Question.id.in_(question_ids))
+        ))
+
+
+def assign_users(trivia_id, user_ids, chunk_size, job=None):
+    """Create participations for ``user_ids`` with one INSERT ... SELECT and commit per chunk."""
+    user_ids = list(dict.fromkeys(user_ids))
+    started_at = datetime.utcnow()
+    assigned = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        result = db.session.execute(_insert_ignore(TriviaParticipation).from_select(
+            PARTICIPATION_COLUMNS, _new_participations(trivia_id, started_at).where(User.id.in_(chunk))
+        ))
+        db.session.commit()
+        assigned += result.rowcount
+        if job is not None:
+            job.advance(len(chunk))
+    return assigned
+
+
+def count_users_by_role(role):
+    return db.session.scalar(db.select(db.func.count(User.id)).where(User.role == role))
+
+
+def assign_users_by_role(trivia_id, role, chunk_size, job=None):
+    """Assign every user with ``role`` using INSERT ... SELECT, one user id range per commit."""
+    max_id = db.session.scalar(db.select(db.func.max(User.id))) or 0
+    started_at = datetime.utcnow()
+    assigned = 0
+
+    for low in range(0, max_id, chunk_size):
+        users = _new_participations(trivia_id, started_at).where(
+            User.role == role, User.id > low, User.id <= low + chunk_size)
+        result = db.session.execute(
+            _insert_ignore(TriviaParticipation).from_select(PARTICIPATION_COLUMNS, users)
+        )
+        db.session.commit()
+        assigned += result.rowcount
+        if job is not None:
+            job.advance(result.rowcount)
+    return assigned
+
+
+def assign(job, trivia_id, user_ids, role, chunk_size):
+    """Assign explicit ``user_ids`` and, optionally, every user with ``role``."""
+    assigned = assign_users(trivia_id, user_ids, chunk_size, job=job)
+    if role is not None:
+        assigned += assign_users_by_role(trivia_id, role, chunk_size, job=job)
+    # Drop the cached assignments of every affected user
+    if role is not None:
+        assignments.clear()
+    elif user_ids:
+        assignments.invalidate(*user_ids)
+    return {"trivia_id": trivia_id, "assigned": assigned}
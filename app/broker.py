@@ -0,0 +1,257 @@
+"""Publish/subscribe for live updates (e.g. the ranking stream).
+
+``BROKER_BACKEND`` selects the implementation:
+
+- ``local`` (default): in-process fan-out. Publishing costs one queue put
+  per subscriber of the channel; only subscribers of the same process see
+  the messages, so ``python -m app.serve`` starts a single worker with it.
+- ``file``: a stand-in for a shared broker when running several worker
+  processes on one host (the production default). Messages are appended as
+  JSON lines to ``BROKER_FILE`` (by default named after the database in the
+  temp directory) and each process tails it and fans them out locally. The
+  file is rotated past ``BROKER_FILE_MAX_SIZE`` bytes.
+- a dotted import path (``package.module:Class``) to plug in another broker
+  with the same interface (``shared``, ``publish``, ``subscribe``,
+  ``unsubscribe``).
+
+Messages must be JSON-serializable. Subscriptions have a bounded buffer
+(``BROKER_BUFFER_SIZE``); a subscriber that falls behind is flagged as
+``lagged`` and further messages are dropped until it drains the buffer, so
+it should resync.
+"""
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from werkzeug.utils import import_string
+from .database import scratch_file
+
+
+class Subscription:
+
+    def __init__(self, channel, buffer_size):
+        self.channel = channel
+        self.lagged = False
+        self._queue = queue.Queue(maxsize=buffer_size)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.lagged = True
+
+    def get(self, timeout=None):
+        """Next message, or ``None`` if nothing arrives within ``timeout`` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Return the pending messages and clear the ``lagged`` flag."""
+        self.lagged = False
+        messages = []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class LocalBroker:
+    """In-process fan-out to the subscribers of each channel."""
+
+    shared = False
+
+    def __init__(self, app):
+        self.buffer_size = app.config['BROKER_BUFFER_SIZE']
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.buffer_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def _lag_all(self):
+        # Messages were missed: every subscriber must resync
+        with self._lock:
+            subscribers = [subscription for channel in self._channels.values() for subscription in channel]
+        for subscription in subscribers:
+            subscription.lagged = True
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = tuple(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+
+class FileBroker(LocalBroker):
+    """Cross-process broker over an append-only JSON lines file.
+
+    Each line is written with a single ``O_APPEND`` write so lines from
+    different processes do not interleave. A thread per process (started with
+    the first subscription, and again after a fork) follows the file from its
+    end every ``BROKER_POLL_INTERVAL`` seconds.
+
+    Past ``BROKER_FILE_MAX_SIZE`` bytes the publisher that notices renames the
+    file to ``BROKER_FILE.1`` (replacing the previous one) and starts a new
+    one with a ``{"generation": n}`` line. Writes hold a shared ``flock`` on
+    ``BROKER_FILE.lock`` and the rotation an exclusive one, so once a reader
+    sees a new file the old one is complete: it reads what is left of it and
+    moves on without losing messages. A reader so far behind that a whole
+    generation went by flags its subscriptions as ``lagged``.
+    """
+
+    shared = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.path = app.config['BROKER_FILE'] or scratch_file(app, 'talatrivia-broker.jsonl')
+        self.max_size = app.config['BROKER_FILE_MAX_SIZE']
+        self.poll_interval = app.config['BROKER_POLL_INTERVAL']
+        self._reader_pid = None
+
+    def _locked(self, operation):
+        # A new descriptor per call: flock locks are shared by descriptors inherited through fork()
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, operation)
+        return fd
+
+    def publish(self, channel, message):
+        line = json.dumps({"channel": channel, "message": message}, separators=(',', ':')) + '\n'
+        lock = self._locked(fcntl.LOCK_SH)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        finally:
+            os.close(lock)
+        if size > self.max_size:
+            self._rotate()
+
+    def _rotate(self):
+        lock = self._locked(fcntl.LOCK_EX)
+        try:
+            # Another publisher may have rotated it meanwhile
+            if os.path.getsize(self.path) <= self.max_size:
+                return
+            with self._open() as fh:
+                generation = self._generation(fh.readline())
+            os.replace(self.path, self.path + '.1')
+            header = json.dumps({"generation": generation + 1}) + '\n'
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, header.encode())
+            finally:
+                os.close(fd)
+        finally:
+            os.close(lock)
+
+    @staticmethod
+    def _generation(line):
+        # The first line of a rotated file; the original file is generation 0
+        try:
+            return json.loads(line).get("generation", 0)
+        except ValueError:
+            return 0
+
+    def _open(self):
+        return os.fdopen(os.open(self.path, os.O_RDONLY | os.O_CREAT, 0o644), 'rb')
+
+    def _rotated(self, fh):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(fh.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        with self._lock:
+            if self._reader_pid != os.getpid():
+                self._reader_pid = os.getpid()
+                fh = self._open()
+                generation = self._generation(fh.readline())
+                fh.seek(0, os.SEEK_END)
+                threading.Thread(target=self._follow, args=(fh, generation),
+                                 name='talatrivia-broker', daemon=True).start()
+        return subscription
+
+    def _follow(self, fh, generation):
+        buffer = b''
+        while True:
+            # Checked before reading: a file renamed by then gets no more writes,
+            # so this read gets the rest of it
+            rotated = self._rotated(fh)
+            chunk = fh.read()
+            if chunk:
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    event = json.loads(line)
+                    if "generation" in event:
+                        if event["generation"] != generation + 1:
+                            self._lag_all()
+                        generation = event["generation"]
+                        continue
+                    self._deliver(event["channel"], event["message"])
+            if rotated:
+                fh.close()
+                fh = self._open()
+            elif not chunk:
+                time.sleep(self.poll_interval)
+
+
+BACKENDS = {
+    'local': LocalBroker,
+    'file': FileBroker,
+}
+
+
+class Broker:
+    """Extension exposing the configured broker backend."""
+
+    def init_app(self, app):
+        backend = app.config['BROKER_BACKEND']
+        cls = BACKENDS.get(backend) or import_string(backend)
+        app.extensions['broker'] = cls(app)
+
+    @property
+    def _backend(self):
+        return current_app.extensions['broker']
+
+    @property
+    def shared(self):
+        """Whether subscribers of other processes get the messages published here."""
+        return self._backend.shared
+
+    def publish(self, channel, message):
+        self._backend.publish(channel, message)
+
+    def subscribe(self, channel):
+        return self._backend.subscribe(channel)
+
+    def unsubscribe(self, subscription):
+        self._backend.unsubscribe(subscription)
+
+
+broker = Broker()
@@ -0,0 +1,390 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from .extensions import db
+from .models import User, Question, Option, Trivia, TriviaQuestion, TriviaParticipation, Difficulty
+from .serializers import get_schema, trivia_serializer
+from .leaderboard import Leaderboard
+from .sampling import build_pools, rule_filter
+from .cache_sync import cache_sync
+
+# Points awarded for a correct answer, by difficulty
+POINTS = {
+    Difficulty.EASY: 1,
+    Difficulty.MEDIUM: 2,
+    Difficulty.HARD: 3,
+}
+
+
+class TriviaCache:
+    """Per-trivia cache of derived, read-only data.
+
+    Entries are built on first use by ``builder(trivia_id)`` and live until
+    they are invalidated by the write endpoints, in every worker process
+    (see ``app.cache_sync``). State is kept per app in ``app.extensions`` so
+    several apps (tests, CLI) never share entries.
+    """
+
+    def __init__(self, name, builder):
+        self.name = name
+        self.builder = builder
+        cache_sync.register(self)
+
+    def init_app(self, app):
+        app.extensions[self.name] = {
+            'entries': {},
+            'generations': {},
+            'epoch': 0,
+            'lock': threading.Lock(),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions[self.name]
+
+    def get(self, trivia_id):
+        state = self._state
+        entry = state['entries'].get(trivia_id)
+        if entry is not None:
+            return entry
+
+        generation = (state['epoch'], state['generations'].get(trivia_id, 0))
+        entry = self.builder(trivia_id)
+        with state['lock']:
+            # Drop the result if the trivia was invalidated while building
+            if (state['epoch'], state['generations'].get(trivia_id, 0)) == generation:
+                state['entries'][trivia_id] = entry
+        return entry
+
+    def peek(self, trivia_id):
+        return self._state['entries'].get(trivia_id)
+
+    def invalidate(self, *trivia_ids):
+        self.drop(trivia_ids)
+        cache_sync.publish(self.name, trivia_ids)
+
+    def clear(self):
+        self.drop(None)
+        cache_sync.publish(self.name, None)
+
+    def notify(self, *trivia_ids):
+        """Invalidate ``trivia_ids`` in the other processes only (this one updated them in place)."""
+        cache_sync.publish(self.name, trivia_ids)
+
+    def drop(self, trivia_ids):
+        """Invalidate ``trivia_ids`` (``None``: every entry) in this process only."""
+        state = self._state
+        with state['lock']:
+            if trivia_ids is None:
+                state['entries'].clear()
+                state['epoch'] += 1
+                return
+            for trivia_id in trivia_ids:
+                state['entries'].pop(trivia_id, None)
+                state['generations'][trivia_id] = state['generations'].get(trivia_id, 0) + 1
+
+
+class TTLCache:
+    """Thread-safe LRU mapping with a size cap and a per-entry time to live."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] is not None and item[0] < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def setdefault(self, key, value):
+        """Store ``value`` unless ``key`` has a live entry; return the entry kept."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[0] is None or item[0] >= time.monotonic()):
+                self._data.move_to_end(key)
+                return item[1]
+            self._store(key, value)
+            return value
+
+    def _store(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _trivia_questions_filter(trivia_id):
+    # The questions of a trivia: its fixed list, or every question its sampling rule can draw
+    rule = db.session.scalar(db.select(Trivia.sampling_rule).where(Trivia.id == trivia_id))
+    if rule:
+        return rule_filter(rule)
+    return [Question.id.in_(
+        db.select(TriviaQuestion.question_id).where(TriviaQuestion.trivia_id == trivia_id)
+    )]
+
+
+def build_answer_key(trivia_id):
+    # {question_id: (points, {correct option ids}, {all option ids}, difficulty)}
+    rows = db.session.execute(
+        db.select(Question.id, Question.difficulty, Option.id, Option.is_correct)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(*_trivia_questions_filter(trivia_id))
+    ).all()
+
+    key = {}
+    for q_id, difficulty, opt_id, is_correct in rows:
+        points, correct, options, _ = key.setdefault(q_id, (POINTS[difficulty], set(), set(), difficulty))
+        if opt_id is None:
+            continue
+        options.add(opt_id)
+        if is_correct:
+            correct.add(opt_id)
+    return {q_id: (points, frozenset(correct), frozenset(options), difficulty)
+            for q_id, (points, correct, options, difficulty) in key.items()}
+
+
+def build_play_payload(trivia_id):
+    # Returns (json bytes, etag): the payload is the same for every player
+    trivia = db.session.get(Trivia, trivia_id)
+    trivia_questions = TriviaQuestion.query.filter_by(trivia_id=trivia_id).options(
+        selectinload(TriviaQuestion.question).selectinload(Question.options)
+    ).all()
+
+    questions_data = []
+    for tq in trivia_questions:
+        q = tq.question
+        # Requirement: "No les muestres cuál es la respuesta correcta ni la dificultad"
+        questions_data.append({
+            "id": q.id,
+            "text": q.text,
+            "options": [{"id": o.id, "text": o.text} for o in q.options]
+        })
+
+    body = current_app.json.response({
+        "trivia": get_schema('TriviaSchema').dump(trivia),
+        "questions": questions_data
+    }).get_data()
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def build_question_bank(trivia_id):
+    # Sampled trivias: the trivia and {question_id: question as in /play} for
+    # every question the rule can draw; each player gets a subset
+    trivia = db.session.get(Trivia, trivia_id)
+    rows = db.session.execute(
+        db.select(Question.id, Question.text, Option.id, Option.text)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(*rule_filter(trivia.sampling_rule))
+        .order_by(Question.id, Option.id)
+    ).all()
+
+    questions = {}
+    for q_id, text, opt_id, opt_text in rows:
+        question = questions.setdefault(q_id, {"id": q_id, "text": text, "options": []})
+        if opt_id is not None:
+            question["options"].append({"id": opt_id, "text": opt_text})
+    return {"trivia": get_schema('TriviaSchema').dump(trivia), "questions": questions}
+
+
+def build_question_pools(tag):
+    # Keyed by tag (None: every question): {difficulty: array of question ids}
+    stmt = db.select(Question.id, Question.difficulty).order_by(Question.id)
+    if tag is not None:
+        stmt = stmt.where(Question.tag == tag)
+    return build_pools(db.session.execute(stmt))
+
+
+def build_leaderboard(trivia_id):
+    # One joined query; later completions are added incrementally by submit_trivia
+    rows = db.session.execute(
+        db.select(TriviaParticipation.id, TriviaParticipation.score,
+                  TriviaParticipation.completed_at, User.name)
+        .join(User, User.id == TriviaParticipation.user_id)
+        .join(Trivia, Trivia.id == TriviaParticipation.trivia_id)
+        .where(TriviaParticipation.trivia_id == trivia_id, TriviaParticipation.completed == True,
+               Trivia.deleted_at.is_(None))
+    ).all()
+
+    board = Leaderboard()
+    for participation_id, score, completed_at, user in rows:
+        board.add(participation_id, score or 0, completed_at, user)
+    return board
+
+
+class AssignmentIndex:
+    """Per-user index of trivia assignments (LRU with TTL).
+
+    ``get(user_id)`` returns ``{"name": ..., "trivias": {trivia_id: assignment}}``
+    where each assignment holds the participation id, score, completion state,
+    sampling pool limit and the trivia summary, so the player endpoints resolve the participation
+    without a query. Entries are invalidated explicitly by create_trivia,
+    submit_trivia and delete_trivia, in every worker process (see
+    ``app.cache_sync``); the TTL only bounds memory.
+    """
+
+    name = 'assignments'
+
+    def __init__(self):
+        cache_sync.register(self)
+
+    def init_app(self, app):
+        app.extensions[self.name] = {
+            'cache': TTLCache(app.config['ASSIGNMENT_CACHE_SIZE'], app.config['ASSIGNMENT_CACHE_TTL']),
+            'generations': {},
+            'epoch': 0,
+            'lock': threading.Lock(),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions[self.name]
+
+    def get(self, user_id):
+        state = self._state
+        entry = state['cache'].get(user_id)
+        if entry is not None:
+            return entry
+
+        generation = (state['epoch'], state['generations'].get(user_id, 0))
+        entry = self._build(user_id)
+        with state['lock']:
+            # Drop the result if the user was invalidated while building
+            if (state['epoch'], state['generations'].get(user_id, 0)) == generation:
+                state['cache'].set(user_id, entry)
+        return entry
+
+    def invalidate(self, *user_ids):
+        self.drop(user_ids)
+        cache_sync.publish(self.name, user_ids)
+
+    def clear(self):
+        self.drop(None)
+        cache_sync.publish(self.name, None)
+
+    def drop(self, user_ids):
+        """Invalidate ``user_ids`` (``None``: every entry) in this process only."""
+        state = self._state
+        with state['lock']:
+            if user_ids is None:
+                state['cache'].clear()
+                state['epoch'] += 1
+                return
+            for user_id in user_ids:
+                state['cache'].pop(user_id)
+                state['generations'][user_id] = state['generations'].get(user_id, 0) + 1
+
+    def _build(self, user_id):
+        rows = db.session.execute(
+            db.select(User.name, TriviaParticipation.id, TriviaParticipation.score,
+                      TriviaParticipation.completed, TriviaParticipation.question_id_limit,
+                      *trivia_serializer.columns)
+            .join(TriviaParticipation, TriviaParticipation.user_id == User.id)
+            .join(Trivia, Trivia.id == TriviaParticipation.trivia_id)
+            .where(User.id == user_id, Trivia.deleted_at.is_(None))
+            .order_by(TriviaParticipation.id)
+        ).all()
+
+        trivias = {}
+        for row in rows:
+            trivia = trivia_serializer.dump_row(row[5:])
+            trivias[trivia['id']] = {
+                "participation_id": row[1],
+                "score": row[2],
+                "completed": row[3],
+                "question_id_limit": row[4],
+                "trivia": trivia
+            }
+        return {"name": rows[0][0] if rows else None, "trivias": trivias}
+
+
+assignments = AssignmentIndex()
+
+answer_keys = TriviaCache('answer_keys', build_answer_key)
+play_payloads = TriviaCache('play_payloads', build_play_payload)
+question_banks = TriviaCache('question_banks', build_question_bank)
+leaderboards = TriviaCache('leaderboards', build_leaderboard)
+
+trivia_caches = (answer_keys, play_payloads, question_banks, leaderboards)
+
+# Same invalidation machinery, keyed by question tag instead of trivia id
+question_pools = TriviaCache('question_pools', build_question_pools)
+
+
+def init_app(app):
+    cache_sync.init_app(app)
+    for cache in trivia_caches:
+        cache.init_app(app)
+    question_pools.init_app(app)
+    assignments.init_app(app)
+
+
+def warm():
+    """Build the answer keys and /play data of the trivias still being played.
+
+    ``app.serve`` runs it before forking so every worker starts with them
+    instead of building them on its first requests. Returns the trivia ids.
+    """
+    pending = db.select(TriviaParticipation.id).where(
+        TriviaParticipation.trivia_id == Trivia.id, TriviaParticipation.completed == False
+    ).exists()
+    trivias = db.session.execute(
+        db.select(Trivia.id, Trivia.sampling_rule).where(Trivia.deleted_at.is_(None), pending)
+    ).all()
+    for trivia_id, rule in trivias:
+        answer_keys.get(trivia_id)
+        if rule:
+            question_pools.get(rule.get('tag'))
+            question_banks.get(trivia_id)
+        else:
+            play_payloads.get(trivia_id)
+    return [trivia_id for trivia_id, _ in trivias]
+
+
+def invalidate_trivias(*trivia_ids):
+    for cache in trivia_caches:
+        cache.invalidate(*trivia_ids)
+
+
+def trivias_for_questions(*question_ids):
+    # Trivias listing the questions, plus every sampled trivia (they may draw them)
+    if not question_ids:
+        return []
+    return db.session.execute(
+        db.select(TriviaQuestion.trivia_id)
+        .where(TriviaQuestion.question_id.in_(question_ids))
+        .union(db.select(Trivia.id).where(Trivia.sampling_rule.isnot(None)))
+    ).scalars().all()
+
+
+def invalidate_questions(*question_ids):
+    """Invalidate every trivia that references one of ``question_ids``."""
+    question_pools.clear()
+    invalidate_trivias(*trivias_for_questions(*question_ids))
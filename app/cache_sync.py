@@ -0,0 +1,196 @@
+"""Propagation of in-memory cache invalidations between worker processes.
+
+The per-process caches of ``app.cache`` (answer keys, /play data, question
+banks and pools, leaderboards, assignments) are invalidated by the write that
+makes them stale, but only in the process that handled it. ``CACHE_SYNC_BACKEND``
+selects how the other processes learn about it:
+
+- ``local`` (default): nothing is propagated; enough for a single process.
+- ``file``: every invalidation is appended to a log in a SQLite file
+  (``CACHE_SYNC_FILE``, by default named after the database in the temp
+  directory) shared by the workers of one host, and each worker
+  replays the entries of the other processes at the start of every request.
+  The log keeps the last ``CACHE_SYNC_HISTORY`` entries; a process that
+  missed trimmed entries clears all its caches instead.
+
+``python -m app.serve`` refuses to run several workers without a shared
+backend (``ProductionConfig`` uses ``file``).
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from flask import current_app
+from .database import scratch_file
+
+
+class ConnectionPool:
+    """SQLite connections to ``path`` reused within a process (never across a fork)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def connection(self):
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = queue.LifoQueue()
+                self._pool_pid = os.getpid()
+            pool = self._pool
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=OFF')
+        return _PooledConnection(conn, pool)
+
+
+class _PooledConnection:
+    """Context manager that hands a connection back to its pool."""
+
+    def __init__(self, conn, pool):
+        self.conn = conn
+        self.pool = pool
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc_info):
+        self.pool.put(self.conn)
+
+
+class LocalCacheSync:
+    """Single process: invalidations stay where they happen."""
+
+    shared = False
+
+    def __init__(self, app):
+        pass
+
+    def publish(self, name, keys):
+        pass
+
+    def pending(self):
+        return []
+
+
+class FileCacheSync:
+    """Invalidation log in a SQLite file shared by the workers of one host."""
+
+    shared = True
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS invalidations (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'origin TEXT NOT NULL, name TEXT NOT NULL, keys TEXT)',
+    )
+
+    def __init__(self, app):
+        self.pool = ConnectionPool(app.config['CACHE_SYNC_FILE'] or scratch_file(app, 'talatrivia-cache-sync.sqlite'))
+        self.history = app.config['CACHE_SYNC_HISTORY']
+        self._origin = None
+        self._origin_pid = None
+        with self.pool.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            # The caches start empty: older entries do not concern this app
+            # (a forked worker inherits this position along with the caches)
+            self.last_id = conn.execute('SELECT coalesce(max(id), 0) FROM invalidations').fetchone()[0]
+
+    @property
+    def origin(self):
+        # Per process, and not the pid alone: a restarted worker may reuse it
+        if self._origin_pid != os.getpid():
+            self._origin = f'{os.getpid()}-{uuid.uuid4().hex}'
+            self._origin_pid = os.getpid()
+        return self._origin
+
+    def publish(self, name, keys):
+        with self.pool.connection() as conn:
+            entry_id = conn.execute(
+                'INSERT INTO invalidations (origin, name, keys) VALUES (?, ?, ?) RETURNING id',
+                (self.origin, name, None if keys is None else json.dumps(list(keys)))).fetchone()[0]
+            if entry_id % 100 == 0:
+                conn.execute('DELETE FROM invalidations WHERE id <= ?', (entry_id - self.history,))
+
+    def pending(self):
+        """``(name, keys)`` published by other processes since the last call.
+
+        ``None`` means some entries were trimmed before being read: every
+        cache must be cleared.
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute('SELECT id, origin, name, keys FROM invalidations WHERE id > ? ORDER BY id',
+                                (self.last_id,)).fetchall()
+        if not rows:
+            return []
+        missed = rows[0][0] != self.last_id + 1
+        self.last_id = rows[-1][0]
+        if missed:
+            return None
+        origin = self.origin
+        return [(name, None if keys is None else json.loads(keys))
+                for _, row_origin, name, keys in rows if row_origin != origin]
+
+
+BACKENDS = {
+    'local': LocalCacheSync,
+    'file': FileCacheSync,
+}
+
+
+class CacheSync:
+    """Extension publishing invalidations and replaying the ones of other processes.
+
+    Caches register with a ``name`` and a ``drop(keys)`` method that
+    invalidates ``keys`` (``None``: everything) in this process only.
+    """
+
+    def __init__(self):
+        self._caches = {}
+
+    def register(self, cache):
+        self._caches[cache.name] = cache
+
+    def init_app(self, app):
+        backend = app.config['CACHE_SYNC_BACKEND']
+        app.extensions['cache_sync'] = {
+            'backend': BACKENDS[backend](app),
+            'lock': threading.Lock(),
+        }
+        app.before_request(self.sync)
+
+    @property
+    def _state(self):
+        return current_app.extensions['cache_sync']
+
+    @property
+    def shared(self):
+        return self._state['backend'].shared
+
+    def publish(self, name, keys):
+        """Tell the other processes to invalidate ``keys`` (``None``: everything) of cache ``name``."""
+        if keys is None or keys:
+            self._state['backend'].publish(name, keys)
+
+    def sync(self):
+        """Apply the invalidations published by the other processes."""
+        state = self._state
+        # Held while applying, so no request of this process reads an entry
+        # another thread has already found stale
+        with state['lock']:
+            pending = state['backend'].pending()
+            if pending is None:
+                for cache in self._caches.values():
+                    cache.drop(None)
+                return
+            for name, keys in pending:
+                cache = self._caches.get(name)
+                if cache is not None:
+                    cache.drop(keys)
+
+
+cache_sync = CacheSync()
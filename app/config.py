@@ -4,3 +4,115 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///../instance/talatrivia.db')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'default-secret-key')
+    # Rows per transaction in POST /questions/bulk
+    QUESTION_IMPORT_BATCH_SIZE = int(os.getenv('QUESTION_IMPORT_BATCH_SIZE', 500))
+    # Participations inserted per commit when assigning users to a trivia
+    TRIVIA_ASSIGN_CHUNK_SIZE = int(os.getenv('TRIVIA_ASSIGN_CHUNK_SIZE', 5000))
+    # Participations (and their answers) deleted per commit when purging a soft-deleted trivia
+    TRIVIA_PURGE_CHUNK_SIZE = int(os.getenv('TRIVIA_PURGE_CHUNK_SIZE', 1000))
+    # Background jobs (e.g. large assignments): worker threads and jobs kept for GET /jobs/<id>,
+    # whose progress is 'local' (in-process) or 'file' (shared by the workers of one host
+    # through JOB_FILE, default: one per database in the temp directory)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_HISTORY = int(os.getenv('JOB_HISTORY', 100))
+    JOB_BACKEND = os.getenv('JOB_BACKEND', 'local')
+    JOB_FILE = os.getenv('JOB_FILE')
+    # Rows fetched per round trip by the streamed listings (?stream=ndjson|json)
+    STREAM_YIELD_PER = int(os.getenv('STREAM_YIELD_PER', 1000))
+    # 'orjson' to serialize responses with orjson (optional dependency)
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'default')
+    # Per-request SQL/latency instrumentation, Server-Timing header and /metrics
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+    # Per-user assignment index used by /my-trivias, /play and /submit
+    ASSIGNMENT_CACHE_SIZE = int(os.getenv('ASSIGNMENT_CACHE_SIZE', 10000))
+    ASSIGNMENT_CACHE_TTL = int(os.getenv('ASSIGNMENT_CACHE_TTL', 300))
+    # Idempotency-Key on POST /submit: responses kept per (user, key), LRU with TTL in seconds
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000))
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+    # Submissions: write-behind group commit (off = one transaction per submit).
+    # SUBMIT_DURABILITY is 'commit' (answer after the batch commits) or 'async'
+    # (answer once queued); a full queue answers 503 with Retry-After
+    SUBMIT_WRITE_BEHIND = os.getenv('SUBMIT_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+    SUBMIT_DURABILITY = os.getenv('SUBMIT_DURABILITY', 'commit')
+    SUBMIT_BATCH_SIZE = int(os.getenv('SUBMIT_BATCH_SIZE', 200))
+    SUBMIT_FLUSH_INTERVAL = float(os.getenv('SUBMIT_FLUSH_INTERVAL', 0.005))
+    SUBMIT_QUEUE_SIZE = int(os.getenv('SUBMIT_QUEUE_SIZE', 5000))
+    SUBMIT_COMMIT_TIMEOUT = float(os.getenv('SUBMIT_COMMIT_TIMEOUT', 30))
+    SUBMIT_RETRY_AFTER = int(os.getenv('SUBMIT_RETRY_AFTER', 1))
+    # Pub/sub for live updates: 'local' (in-process), 'file' (shared by the workers
+    # of one host through BROKER_FILE, default: one per database in the temp
+    # directory) or a 'module:Class' import path
+    BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'local')
+    BROKER_FILE = os.getenv('BROKER_FILE')
+    BROKER_POLL_INTERVAL = float(os.getenv('BROKER_POLL_INTERVAL', 0.1))
+    # BROKER_FILE is rotated (to BROKER_FILE.1) once it grows past this many bytes
+    BROKER_FILE_MAX_SIZE = int(os.getenv('BROKER_FILE_MAX_SIZE', 16 * 1024 * 1024))
+    BROKER_BUFFER_SIZE = int(os.getenv('BROKER_BUFFER_SIZE', 1000))
+    # GET /trivias/<id>/ranking/stream: default top-K and keep-alive interval (seconds)
+    RANKING_STREAM_TOP = int(os.getenv('RANKING_STREAM_TOP', 10))
+    RANKING_STREAM_HEARTBEAT = float(os.getenv('RANKING_STREAM_HEARTBEAT', 15))
+    # Response cache of the public listings and rankings: local | file | none | module:Class,
+    # max entries, largest body stored (bytes) and the SQLite file of the `file` backend
+    # (default: one per database in the temp directory, see database.scratch_file)
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'local')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1000))
+    RESPONSE_CACHE_MAX_ENTRY_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_ENTRY_SIZE', 1024 * 1024))
+    RESPONSE_CACHE_FILE = os.getenv('RESPONSE_CACHE_FILE')
+    # Propagation of the in-memory cache invalidations between worker processes:
+    # 'local' (single process) or 'file' (log in CACHE_SYNC_FILE, replayed on every
+    # request; default: one per database in the temp directory)
+    CACHE_SYNC_BACKEND = os.getenv('CACHE_SYNC_BACKEND', 'local')
+    CACHE_SYNC_FILE = os.getenv('CACHE_SYNC_FILE')
+    CACHE_SYNC_HISTORY = int(os.getenv('CACHE_SYNC_HISTORY', 10000))
+    # GET /leaderboard: entries per page when ?limit= is not given
+    LEADERBOARD_PAGE_SIZE = int(os.getenv('LEADERBOARD_PAGE_SIZE', 50))
+    # Users recomputed per commit by `flask stats rebuild-players`
+    PLAYER_STATS_CHUNK_SIZE = int(os.getenv('PLAYER_STATS_CHUNK_SIZE', 1000))
+    # GET /trivias/<id>/export: gzip the stream when the client accepts it
+    EXPORT_GZIP = os.getenv('EXPORT_GZIP', '1').lower() in ('1', 'true', 'yes')
+    EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', 6))
+    # SQLite: pragmas run on every new connection, and an optional read-only pool
+    # for the views marked with @read_only (see app/database.py). Foreign keys are
+    # always enforced so the ON DELETE CASCADE clauses apply
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+    SQLITE_READ_WRITE_SPLIT = False
+    SQLITE_READER_POOL_SIZE = int(os.getenv('SQLITE_READER_POOL_SIZE', 8))
+    # Password hashing: process pool size (0 = inline), max hashes pending before
+    # answering 503, and an opt-in cache of recent successful logins (TTL in seconds, 0 = off)
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', 0))
+    HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', 32))
+    HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+    HASH_RETRY_AFTER = int(os.getenv('HASH_RETRY_AFTER', 1))
+    LOGIN_CACHE_TTL = int(os.getenv('LOGIN_CACHE_TTL', 0))
+    LOGIN_CACHE_SIZE = int(os.getenv('LOGIN_CACHE_SIZE', 10000))
+
+class ProductionConfig(Config):
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+        'temp_store': 'MEMORY',
+    }
+    # A single writer connection: writes queue on the pool instead of on SQLite's lock
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 30,
+    }
+    SQLITE_READ_WRITE_SPLIT = True
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', os.cpu_count() or 1))
+    # app.serve runs several worker processes
+    CACHE_SYNC_BACKEND = os.getenv('CACHE_SYNC_BACKEND', 'file')
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'file')
+    BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'file')
+    JOB_BACKEND = os.getenv('JOB_BACKEND', 'file')
+
+
+configs = {
+    'development': Config,
+    'production': ProductionConfig,
+}
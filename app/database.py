@@ -0,0 +1,147 @@
+"""SQLite engine profile: connection pragmas and a read/write split.
+
+With ``SQLITE_READ_WRITE_SPLIT`` a ``read`` bind is added that opens the same
+database file read-only (``mode=ro``) with its own pool. Views decorated with
+:func:`read_only` run their queries on it, everything else goes through the
+default engine, which the production profile limits to a single connection
+so writes are serialized in-process instead of failing with
+``database is locked``.
+
+``flask schema upgrade`` applies the migrations to any database, including
+one created with ``db.create_all()`` before they existed (no
+``alembic_version`` table), which is stamped first.
+"""
+from functools import wraps
+import hashlib
+import os
+import tempfile
+import click
+from flask import current_app, g, has_app_context
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+
+READ_BIND = 'read'
+
+# Pragmas that change the database file and cannot run on a read-only connection
+WRITE_PRAGMAS = {'journal_mode'}
+
+
+class RoutingSession(Session):
+    """Session that sends the queries of read-only views to the ``read`` bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('db_read_only'):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Run the view's queries on the read-only pool when the split is enabled."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def scratch_file(app, name):
+    """Path of ``name`` in the temp directory, suffixed with a digest of the database URL.
+
+    Deployments sharing a host but not a database get separate files.
+    """
+    with app.app_context():
+        url = app.extensions['sqlalchemy'].engine.url
+    digest = hashlib.sha1(url.render_as_string(hide_password=False).encode()).hexdigest()[:12]
+    stem, extension = os.path.splitext(name)
+    return os.path.join(tempfile.gettempdir(), f'{stem}-{digest}{extension}')
+
+
+def add_read_bind(app):
+    """Declare the read-only bind; must run before ``db.init_app``."""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if not app.config['SQLITE_READ_WRITE_SPLIT'] or not _is_sqlite_file(url):
+        return
+
+    database = url.database if url.query.get('uri') else f'file:{url.database}'
+    app.config['SQLALCHEMY_BINDS'] = {
+        **app.config.get('SQLALCHEMY_BINDS', {}),
+        READ_BIND: {
+            'url': url.update_query_dict({'mode': 'ro', 'uri': 'true'}).set(database=database),
+            'pool_size': app.config['SQLITE_READER_POOL_SIZE'],
+            'max_overflow': 0,
+        },
+    }
+
+
+def apply_pragmas(app, engines):
+    """Run ``SQLITE_PRAGMAS`` on every new connection of the SQLite engines."""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    if not pragmas:
+        return
+
+    for key, engine in engines.items():
+        if not _is_sqlite_file(engine.url):
+            continue
+        statements = [
+            f'PRAGMA {name}={value}' for name, value in pragmas.items()
+            if key != READ_BIND or name not in WRITE_PRAGMAS
+        ]
+
+        def on_connect(dbapi_connection, connection_record, statements=statements):
+            cursor = dbapi_connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+
+        event.listen(engine, 'connect', on_connect)
+
+
+# First migration: the schema db.create_all() built before migrations existed
+INITIAL_REVISION = '40a4feabf1cc'
+INITIAL_TABLES = {'users', 'questions', 'options', 'trivias', 'trivia_questions', 'trivia_participations',
+                  'user_answers'}
+
+schema_cli = AppGroup('schema', help='Database schema.')
+
+
+def legacy_revision(db):
+    """Revision to stamp a database created with ``db.create_all()``, or ``None``.
+
+    ``None`` if the database is empty or already versioned. Raises
+    ``click.ClickException`` if the tables match no known revision.
+    """
+    tables = set(inspect(db.engine).get_table_names())
+    if not tables or 'alembic_version' in tables:
+        return None
+    if set(db.metadata.tables) <= tables:
+        return 'head'
+    if tables == INITIAL_TABLES:
+        return INITIAL_REVISION
+    raise click.ClickException("Esquema sin versionar desconocido: marcar la revisión con `flask db stamp`")
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Apply the migrations, stamping a database created with create_all() first."""
+    from flask_migrate import stamp, upgrade
+    from .extensions import db
+    from .stats import backfill, rebuild_players
+
+    revision = legacy_revision(db)
+    if revision is not None:
+        click.echo(f"Base de datos sin migraciones: marcada con la revisión {revision}")
+        stamp(revision=revision)
+    upgrade()
+    if revision == INITIAL_REVISION:
+        # Its answers predate the statistics tables
+        backfill()
+        rebuild_players(current_app.config['PLAYER_STATS_CHUNK_SIZE'])
+        click.echo("Estadísticas recalculadas")
@@ -0,0 +1,93 @@
+"""Set-based deletes of trivias and questions.
+
+Child rows are removed with ``DELETE ... WHERE ... IN (SELECT ...)``
+statements instead of being loaded into the session; the foreign keys also
+carry ``ON DELETE CASCADE`` (enforced with ``PRAGMA foreign_keys=ON``) so
+nothing is orphaned if a row is deleted some other way. Large trivias can be
+soft-deleted (``deleted_at``) and purged in the background, one chunk of
+participations per transaction, so the write lock is never held for long.
+"""
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .extensions import db
+from .models import (Question, Option, Trivia, TriviaQuestion, TriviaParticipation, UserAnswer, QuestionStats,
+                     OptionStats, TriviaStats, TriviaDifficultyStats)
+from .stats import discount_trivia, discount_question
+
+
+def participant_ids(trivia_id):
+    """User ids assigned to ``trivia_id`` (their cached assignments go stale on delete)."""
+    return db.session.scalars(
+        db.select(TriviaParticipation.user_id).where(TriviaParticipation.trivia_id == trivia_id)
+    ).all()
+
+
+def _delete_participations(participations):
+    # Answers first: ``participations`` is a subquery or a list of ids
+    db.session.execute(db.delete(UserAnswer).where(UserAnswer.participation_id.in_(participations)))
+    db.session.execute(db.delete(TriviaParticipation).where(TriviaParticipation.id.in_(participations)))
+
+
+def delete_trivia_cascade(trivia_id):
+    """Delete a trivia and everything that hangs from it (the caller commits)."""
+    discount_trivia(trivia_id)
+    _delete_participations(
+        db.select(TriviaParticipation.id).where(TriviaParticipation.trivia_id == trivia_id)
+    )
+    for model in (TriviaQuestion, TriviaStats, TriviaDifficultyStats):
+        db.session.execute(db.delete(model).where(model.trivia_id == trivia_id))
+    db.session.execute(db.delete(Trivia).where(Trivia.id == trivia_id))
+
+
+def soft_delete_trivia(trivia_id):
+    """Hide a trivia until :func:`purge_trivia` removes it (the caller commits)."""
+    # Its points leave the leaderboard now; the purge then finds it discounted
+    discount_trivia(trivia_id)
+    db.session.execute(
+        db.update(Trivia).where(Trivia.id == trivia_id).values(deleted_at=datetime.utcnow())
+    )
+
+
+def purge_trivia(job, trivia_id, chunk_size):
+    """Delete a soft-deleted trivia, committing every ``chunk_size`` participations."""
+    purged = 0
+    while True:
+        chunk = db.session.scalars(
+            db.select(TriviaParticipation.id)
+            .where(TriviaParticipation.trivia_id == trivia_id)
+            .order_by(TriviaParticipation.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+        _delete_participations(chunk)
+        db.session.commit()
+        purged += len(chunk)
+        if job is not None:
+            job.advance(len(chunk))
+
+    delete_trivia_cascade(trivia_id)
+    db.session.commit()
+    return {"trivia_id": trivia_id, "participations": purged}
+
+
+def delete_question_cascade(question_id):
+    """Delete a question with its options, answers and trivia links (the caller commits)."""
+    discount_question(question_id)
+    for model in (UserAnswer, TriviaQuestion, QuestionStats, OptionStats, Option):
+        db.session.execute(db.delete(model).where(model.question_id == question_id))
+    db.session.execute(db.delete(Question).where(Question.id == question_id))
+
+
+trivias_cli = AppGroup('trivias', help='Trivia maintenance.')
+
+
+@trivias_cli.command('purge')
+def purge_command():
+    """Finish purging soft-deleted trivias (e.g. after a restart mid-purge)."""
+    trivia_ids = db.session.scalars(db.select(Trivia.id).where(Trivia.deleted_at.isnot(None))).all()
+    for trivia_id in trivia_ids:
+        result = purge_trivia(None, trivia_id, current_app.config['TRIVIA_PURGE_CHUNK_SIZE'])
+        click.echo(f"Trivia {trivia_id}: {result['participations']} participaciones eliminadas")
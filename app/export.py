@@ -0,0 +1,120 @@
+"""Streamed result exports (``GET /trivias/<id>/export?format=csv|ndjson``).
+
+One joined Core query over participations, users, answers, questions and
+options is read from the cursor with ``yield_per``; each batch is written out
+as soon as it is formatted, so memory stays flat regardless of the number of
+answers. When the client accepts it, the stream is gzip-compressed on the fly.
+"""
+import csv
+import io
+import zlib
+from flask import current_app, request, stream_with_context
+from .extensions import db
+from .models import User, Question, Option, TriviaParticipation, UserAnswer
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _enum_name(value):
+    return value.name
+
+
+# (output key, column, converter); pending or unanswered participations have
+# a single row with empty answer columns
+COLUMNS = (
+    ('participation_id', TriviaParticipation.id, None),
+    ('user_id', User.id, None),
+    ('user_name', User.name, None),
+    ('user_email', User.email, None),
+    ('completed', TriviaParticipation.completed, None),
+    ('score', TriviaParticipation.score, None),
+    ('started_at', TriviaParticipation.started_at, _isoformat),
+    ('completed_at', TriviaParticipation.completed_at, _isoformat),
+    ('question_id', Question.id, None),
+    ('question', Question.text, None),
+    ('difficulty', Question.difficulty, _enum_name),
+    ('option_id', Option.id, None),
+    ('option', Option.text, None),
+    ('is_correct', UserAnswer.is_correct, None),
+    ('points_awarded', UserAnswer.points_awarded, None),
+)
+KEYS = tuple(key for key, _, _ in COLUMNS)
+CONVERTERS = tuple((index, converter) for index, (_, _, converter) in enumerate(COLUMNS) if converter)
+
+
+def export_query(trivia_id):
+    return (
+        db.select(*(column for _, column, _ in COLUMNS))
+        .select_from(TriviaParticipation)
+        .join(User, User.id == TriviaParticipation.user_id)
+        .outerjoin(UserAnswer, UserAnswer.participation_id == TriviaParticipation.id)
+        .outerjoin(Question, Question.id == UserAnswer.question_id)
+        .outerjoin(Option, Option.id == UserAnswer.selected_option_id)
+        .where(TriviaParticipation.trivia_id == trivia_id)
+        .order_by(TriviaParticipation.id, UserAnswer.id)
+        .execution_options(yield_per=current_app.config['STREAM_YIELD_PER'])
+    )
+
+
+def _values(row):
+    values = list(row)
+    for index, converter in CONVERTERS:
+        if values[index] is not None:
+            values[index] = converter(values[index])
+    return values
+
+
+def _csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(KEYS)
+    for rows in partitions:
+        writer.writerows(_values(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(partitions):
+    dumps = current_app.json.dumps
+    for rows in partitions:
+        yield ''.join(dumps(dict(zip(KEYS, _values(row)))) + '\n' for row in rows)
+
+
+def _gzip(chunks, level):
+    # wbits=31: zlib stream with a gzip header and trailer
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(trivia_id, fmt):
+    """Stream the results of ``trivia_id`` as ``fmt`` (``csv`` or ``ndjson``)."""
+    def generate():
+        partitions = db.session.execute(export_query(trivia_id)).partitions()
+        chunks = _csv_chunks(partitions) if fmt == 'csv' else _ndjson_chunks(partitions)
+        for chunk in chunks:
+            yield chunk.encode()
+
+    headers = {
+        'Content-Disposition': f'attachment; filename=trivia-{trivia_id}-resultados.{fmt}',
+        'Vary': 'Accept-Encoding',
+    }
+    body = generate()
+    if current_app.config['EXPORT_GZIP'] and request.accept_encodings['gzip']:
+        body = _gzip(body, current_app.config['EXPORT_GZIP_LEVEL'])
+        headers['Content-Encoding'] = 'gzip'
+
+    return current_app.response_class(stream_with_context(body), mimetype=MIMETYPES[fmt], headers=headers)
@@ -0,0 +1,117 @@
+"""Password hashing off the request thread.
+
+The KDF (scrypt/pbkdf2) runs in a bounded process pool (``HASH_WORKERS``;
+0 runs it inline). At most ``HASH_MAX_PENDING`` hashes may be queued or
+running; beyond that, or when a hash takes longer than ``HASH_TIMEOUT``
+seconds, :class:`Overloaded` is raised so the request fails with a 503
+instead of piling up. Successful verifications can be cached for
+``LOGIN_CACHE_TTL`` seconds so repeated logins skip the KDF.
+"""
+import hashlib
+import hmac
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from .cache import TTLCache
+
+
+class Overloaded(Exception):
+    """Too many password hashes pending; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+def _ignore_interrupt():
+    # Ctrl+C reaches the whole process group: the pool is shut down by its owner
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class PasswordHasher:
+
+    def init_app(self, app):
+        ttl = app.config['LOGIN_CACHE_TTL']
+        app.extensions['password_hasher'] = {
+            'executor': None,
+            'pid': None,
+            'lock': threading.Lock(),
+            'slots': threading.BoundedSemaphore(app.config['HASH_MAX_PENDING']),
+            'cache': TTLCache(app.config['LOGIN_CACHE_SIZE'], ttl) if ttl else None,
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['password_hasher']
+
+    def _executor(self, state):
+        workers = current_app.config['HASH_WORKERS']
+        if not workers:
+            return None
+        # One pool per process: a pool inherited through fork() is unusable
+        with state['lock']:
+            if state['executor'] is None or state['pid'] != os.getpid():
+                state['executor'] = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_ignore_interrupt)
+                state['pid'] = os.getpid()
+            return state['executor']
+
+    def shutdown(self):
+        """Stop the pool of this process (e.g. when a server worker exits)."""
+        state = self._state
+        with state['lock']:
+            if state['executor'] is not None and state['pid'] == os.getpid():
+                state['executor'].shutdown()
+            state['executor'] = None
+
+    def _run(self, fn, *args):
+        state = self._state
+        slots = state['slots']
+        if not slots.acquire(blocking=False):
+            raise Overloaded(current_app.config['HASH_RETRY_AFTER'])
+        try:
+            executor = self._executor(state)
+            future = executor.submit(fn, *args) if executor is not None else None
+        except BaseException:
+            slots.release()
+            raise
+        if future is None:
+            try:
+                return fn(*args)
+            finally:
+                slots.release()
+        # The slot is held until the hash is done, even past the timeout
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=current_app.config['HASH_TIMEOUT'])
+        except FuturesTimeoutError:
+            # Same answer as a full queue: the pool is not keeping up
+            raise Overloaded(current_app.config['HASH_RETRY_AFTER']) from None
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password)
+
+    def check(self, pwhash, password):
+        cache = self._state['cache']
+        if cache is None:
+            return self._run(check_password_hash, pwhash, password)
+
+        # Keyed by the stored hash, so a password change never hits a stale entry;
+        # the password itself is only kept as an HMAC digest
+        digest = hmac.new(current_app.config['JWT_SECRET_KEY'].encode(),
+                          password.encode(), hashlib.sha256).digest()
+        key = (pwhash, digest)
+        if cache.get(key):
+            return True
+        valid = self._run(check_password_hash, pwhash, password)
+        if valid:
+            cache.set(key, True)
+        return valid
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,74 @@
+"""``Idempotency-Key`` support for write endpoints (``POST /trivias/<id>/submit``).
+
+The first request carrying a key reserves it for the authenticated user; its
+final response is kept in a bounded LRU with a TTL (``IDEMPOTENCY_CACHE_SIZE``
+/ ``IDEMPOTENCY_TTL``) and a retry with the same key gets that response back
+without running the view or touching the database. A retry that arrives while
+the first request is still running gets 409, and reusing a key for a
+different request gets 422. Server errors (5xx) are not stored, so the client
+can retry them.
+
+The store is per process: with several workers a retry may land on another
+one, and then the atomic completion check of the submit path answers it.
+"""
+import hashlib
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from .cache import TTLCache
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+
+    def init_app(self, app):
+        app.extensions['idempotency'] = TTLCache(app.config['IDEMPOTENCY_CACHE_SIZE'],
+                                                 app.config['IDEMPOTENCY_TTL'])
+
+    @property
+    def _cache(self):
+        return current_app.extensions['idempotency']
+
+    def __call__(self, view):
+        """Decorate a view (below ``@jwt_required()``) to honour ``Idempotency-Key``."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"message": "Idempotency-Key demasiado larga"}), 400
+
+            cache = self._cache
+            cache_key = (get_jwt_identity(), key)
+            fingerprint = (request.method, request.path, hashlib.sha1(request.get_data()).hexdigest())
+            reservation = (fingerprint, None)
+            entry = cache.setdefault(cache_key, reservation)
+
+            if entry is not reservation:
+                stored_fingerprint, stored = entry
+                if stored_fingerprint != fingerprint:
+                    return jsonify({"message": "Idempotency-Key ya usada en otra solicitud"}), 422
+                if stored is None:
+                    return jsonify({"message": "Solicitud en curso, reintenta más tarde"}), 409
+                body, status, mimetype = stored
+                response = current_app.response_class(body, status=status, mimetype=mimetype)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                cache.pop(cache_key)
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                cache.pop(cache_key)
+            else:
+                cache.set(cache_key, (fingerprint, (response.get_data(), response.status_code, response.mimetype)))
+            return response
+        return wrapper
+
+
+idempotent = IdempotencyStore()
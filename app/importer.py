@@ -0,0 +1,152 @@
+"""Streaming import of question banks (``POST /questions/bulk``).
+
+The body is read as binary lines and each parser decodes them itself, so an
+invalid byte is pinned to its line: in NDJSON it is one more row error, in
+CSV it stops the import (the reader cannot resume mid-file) with
+:class:`UnreadableBody`, like a malformed CSV. Batches committed before that
+point stay imported and are reported.
+"""
+import csv
+import io
+import json
+from marshmallow import EXCLUDE, ValidationError
+from .extensions import db
+from .models import Question, Option
+from .serializers import get_schema
+from .cache import invalidate_questions
+
+
+class UnreadableBody(Exception):
+    """The body cannot be parsed from ``line`` on; ``result`` holds what was imported before it."""
+
+    def __init__(self, line, reason):
+        super().__init__(f"Line {line}: {reason}")
+        self.line = line
+        self.reason = reason
+        self.result = None
+
+
+def iter_ndjson(lines):
+    """Yield ``(line_no, row)`` for each non-empty line of an NDJSON body.
+
+    ``row`` is the exception for a line that is not UTF-8 JSON.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as exc:
+            yield line_no, exc
+
+
+def iter_csv(lines):
+    """Yield ``(line_no, row)`` from a CSV body.
+
+    Header: ``text,difficulty,correct,option_1,option_2,...`` and an optional
+    ``tag``. ``correct`` is the 1-based position of the correct option (``1|3``
+    for several). Raises :class:`UnreadableBody` at an invalid byte or
+    malformed CSV.
+    """
+    reader = csv.DictReader(line.decode('utf-8') for line in lines)
+    try:
+        option_columns = [c for c in reader.fieldnames or [] if c.startswith('option_')]
+        for record in reader:
+            correct = {c.strip() for c in (record.get('correct') or '').split('|')}
+            options = []
+            for position, column in enumerate(option_columns, start=1):
+                text = record.get(column)
+                if text:
+                    options.append({"text": text, "is_correct": str(position) in correct})
+            yield reader.line_num, {
+                "text": record.get('text') or None,
+                "difficulty": record.get('difficulty') or None,
+                "tag": record.get('tag') or None,
+                "options": options
+            }
+    # DictReader.line_num only moves on parsed records: errors use the inner reader's
+    except UnicodeDecodeError as exc:
+        # Raised while fetching the line after the last one the reader counted
+        raise UnreadableBody(reader.reader.line_num + 1, f"UTF-8 inválido: {exc}") from exc
+    except csv.Error as exc:
+        raise UnreadableBody(reader.reader.line_num, f"CSV inválido: {exc}") from exc
+
+
+def validate_row(row):
+    """Return ``(errors, row)`` using the QuestionSchema column rules."""
+    if isinstance(row, UnicodeDecodeError):
+        return {"_schema": [f"UTF-8 inválido: {row}"]}, None
+    if isinstance(row, Exception):
+        return {"_schema": [f"JSON inválido: {row}"]}, None
+    if not isinstance(row, dict):
+        return {"_schema": ["Se esperaba un objeto"]}, None
+
+    if isinstance(row.get('difficulty'), str):
+        row['difficulty'] = row['difficulty'].upper()
+    try:
+        return None, get_schema('QuestionImportSchema', unknown=EXCLUDE).load(row)
+    except ValidationError as exc:
+        return exc.messages, None
+
+
+def import_questions(rows, batch_size=500):
+    """Insert questions and options from ``(line_no, row)`` pairs.
+
+    Valid rows are written in executemany batches, one transaction per batch.
+    Invalid rows (and rows of a batch that fails to insert) are reported back
+    without aborting the rest of the import. If ``rows`` raises
+    :class:`UnreadableBody`, the rows read so far are still written and it
+    is re-raised with the ``result``.
+    """
+    imported = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal imported
+        try:
+            question_ids = db.session.scalars(
+                db.insert(Question).returning(Question.id, sort_by_parameter_order=True),
+                [{"text": row['text'], "difficulty": row['difficulty'], "tag": row.get('tag')}
+                 for _, row in batch]
+            ).all()
+            options = [
+                {"question_id": q_id, "text": opt['text'], "is_correct": opt.get('is_correct', False)}
+                for q_id, (_, row) in zip(question_ids, batch)
+                for opt in row.get('options', [])
+            ]
+            if options:
+                db.session.execute(db.insert(Option), options)
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            errors.extend({"line": line_no, "errors": {"_schema": [str(exc)]}} for line_no, _ in batch)
+        else:
+            imported += len(batch)
+            invalidate_questions(*question_ids)
+        batch.clear()
+
+    try:
+        for line_no, row in rows:
+            row_errors, row = validate_row(row)
+            if row_errors:
+                errors.append({"line": line_no, "errors": row_errors})
+                continue
+            batch.append((line_no, row))
+            if len(batch) >= batch_size:
+                flush()
+    except UnreadableBody as exc:
+        if batch:
+            flush()
+        errors.append({"line": exc.line, "errors": {"_schema": [exc.reason]}})
+        exc.result = {"imported": imported, "errors": errors}
+        raise
+    if batch:
+        flush()
+
+    return {"imported": imported, "errors": errors}
+
+
+def body_lines(raw):
+    """The lines of a binary stream, undecoded (see the module docstring)."""
+    return io.BufferedReader(raw)
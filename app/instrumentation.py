@@ -0,0 +1,189 @@
+"""Opt-in per-request instrumentation (``INSTRUMENTATION_ENABLED``).
+
+Counts SQL queries and time with cursor events, times JSON serialization and
+total latency per endpoint, adds a ``Server-Timing`` header, logs slow
+requests and exposes histograms at ``/metrics`` in Prometheus text format,
+along with the metrics of other extensions (``add_collector``). Metrics are
+per process.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from .extensions import db
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+METRICS = (
+    # (name, help, buckets, request stat)
+    ('talatrivia_request_duration_seconds', 'Total request latency.', LATENCY_BUCKETS, 'total'),
+    ('talatrivia_sql_duration_seconds', 'Time spent executing SQL per request.', LATENCY_BUCKETS, 'sql_time'),
+    ('talatrivia_serialization_duration_seconds', 'Time spent serializing JSON per request.', LATENCY_BUCKETS, 'ser_time'),
+    ('talatrivia_sql_queries', 'SQL queries executed per request.', QUERY_BUCKETS, 'sql_count'),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def _stats():
+    if has_request_context():
+        return g.get('_instrumentation')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context rather than the connection: a statement that
+    # raises leaves nothing behind on a pooled connection
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = _stats()
+    if stats is not None:
+        stats['sql_count'] += 1
+        stats['sql_time'] += elapsed
+
+
+@contextmanager
+def timer(stat):
+    """Add the time spent in the block to a per-request stat (no-op when disabled)."""
+    stats = _stats()
+    if stats is None or stats['timing']:
+        yield
+        return
+    stats['timing'] = True
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats[stat] += time.perf_counter() - t0
+        stats['timing'] = False
+
+
+class Instrumentation:
+
+    def init_app(self, app):
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        app.extensions['instrumentation'] = {
+            'histograms': {},
+            'collectors': [],
+            'lock': threading.Lock(),
+        }
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+
+        self._time_json_provider(app.json)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def add_collector(self, app, collector):
+        """Append ``collector()`` (lines of Prometheus text) to ``/metrics``; no-op when disabled."""
+        state = app.extensions.get('instrumentation')
+        if state is not None:
+            state['collectors'].append(collector)
+
+    def instrument_engine(self, engine):
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _time_json_provider(self, provider):
+        # Wrap the provider instance so jsonify() and app.json.dumps() are timed
+        for name in ('dumps', 'response'):
+            original = getattr(provider, name)
+
+            def timed(*args, _original=original, **kwargs):
+                with timer('ser_time'):
+                    return _original(*args, **kwargs)
+            setattr(provider, name, timed)
+
+    def _start_request(self):
+        g._instrumentation = {
+            'start': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'ser_time': 0.0,
+            'timing': False,
+        }
+
+    def _finish_request(self, response):
+        stats = g.pop('_instrumentation', None)
+        if stats is None:
+            return response
+        stats['total'] = time.perf_counter() - stats['start']
+        endpoint = request.endpoint or 'unmatched'
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats["sql_time"] * 1000:.2f};desc="{stats["sql_count"]} queries", '
+            f'ser;dur={stats["ser_time"] * 1000:.2f}, '
+            f'total;dur={stats["total"] * 1000:.2f}'
+        )
+
+        if stats['total'] * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            current_app.logger.warning(
+                "Slow request %s %s (%s): %.1fms, %d queries in %.1fms, serialization %.1fms",
+                request.method, request.path, endpoint, stats['total'] * 1000,
+                stats['sql_count'], stats['sql_time'] * 1000, stats['ser_time'] * 1000
+            )
+
+        state = current_app.extensions['instrumentation']
+        with state['lock']:
+            histograms = state['histograms'].get(endpoint)
+            if histograms is None:
+                histograms = state['histograms'][endpoint] = {
+                    name: Histogram(buckets) for name, _, buckets, _ in METRICS
+                }
+            for name, _, _, stat in METRICS:
+                histograms[name].observe(stats[stat])
+        return response
+
+    def metrics_view(self):
+        state = current_app.extensions['instrumentation']
+        lines = []
+        with state['lock']:
+            for name, help_text, _, _ in METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histograms in sorted(state['histograms'].items()):
+                    lines.extend(histograms[name].render(name, f'endpoint="{endpoint}"'))
+        for collector in state['collectors']:
+            lines.extend(collector())
+        return current_app.response_class(
+            '\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4'
+        )
+
+
+instrumentation = Instrumentation()
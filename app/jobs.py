@@ -0,0 +1,198 @@
+"""Background jobs (large assignments, trivia purges) and their progress.
+
+``JOB_BACKEND`` selects where the progress reported by ``GET /jobs/<id>``
+lives:
+
+- ``local`` (default): in the process that runs the job; enough for a
+  single process.
+- ``file``: in a SQLite file (``JOB_FILE``, by default named after the
+  database in the temp directory) shared by the workers of one host, so any
+  worker answers for the jobs of the others (the production default).
+
+Only the last ``JOB_HISTORY`` jobs are kept. A worker that shuts down
+finishes its jobs first; jobs of a worker that dies or is killed before
+they finish are reported as ``failed`` (``python -m app.serve`` marks them).
+"""
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from .cache_sync import ConnectionPool
+from .database import scratch_file
+
+INTERRUPTED = "Interrumpida: el proceso que la ejecutaba terminó"
+
+
+class Job:
+    """Progress of a background task, as reported by GET /jobs/<id>."""
+
+    def __init__(self, name, store, total=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'pending'
+        self.done = 0
+        self.total = total
+        self.result = None
+        self.error = None
+        self._store = store
+
+    def advance(self, count):
+        self.done += count
+        self._store.save(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class LocalJobStore:
+    """The jobs of this process, in memory."""
+
+    shared = False
+
+    def __init__(self, app):
+        self.history = app.config['JOB_HISTORY']
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+
+    def save(self, job):
+        pass
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def interrupt(self, pid):
+        pass
+
+
+class FileJobStore:
+    """Job progress in a SQLite file shared by the workers of one host."""
+
+    shared = True
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, '
+        'pid INTEGER NOT NULL, state TEXT NOT NULL)',
+    )
+
+    def __init__(self, app):
+        self.history = app.config['JOB_HISTORY']
+        self.pool = ConnectionPool(app.config['JOB_FILE'] or scratch_file(app, 'talatrivia-jobs.sqlite'))
+        with self.pool.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def add(self, job):
+        with self.pool.connection() as conn:
+            seq = conn.execute('INSERT INTO jobs (id, pid, state) VALUES (?, ?, ?) RETURNING seq',
+                               (job.id, os.getpid(), json.dumps(job.to_dict()))).fetchone()[0]
+            conn.execute('DELETE FROM jobs WHERE seq <= ?', (seq - self.history,))
+
+    def save(self, job):
+        with self.pool.connection() as conn:
+            conn.execute('UPDATE jobs SET state = ? WHERE id = ?', (json.dumps(job.to_dict()), job.id))
+
+    def get(self, job_id):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def interrupt(self, pid):
+        """Report the unfinished jobs of process ``pid``, which is gone, as failed."""
+        with self.pool.connection() as conn:
+            for job_id, state in conn.execute('SELECT id, state FROM jobs WHERE pid = ?', (pid,)).fetchall():
+                state = json.loads(state)
+                if state["status"] in ('pending', 'running'):
+                    state.update(status='failed', error=INTERRUPTED)
+                    conn.execute('UPDATE jobs SET state = ? WHERE id = ?', (json.dumps(state), job_id))
+
+
+BACKENDS = {
+    'local': LocalJobStore,
+    'file': FileJobStore,
+}
+
+
+class JobRunner:
+    """Runs functions in a small thread pool, each inside an app context."""
+
+    def init_app(self, app):
+        app.extensions['jobs'] = {
+            'executor': None,
+            'store': BACKENDS[app.config['JOB_BACKEND']](app),
+            'lock': threading.Lock(),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['jobs']
+
+    @property
+    def shared(self):
+        return self._state['store'].shared
+
+    def submit(self, name, fn, *args, total=None, **kwargs):
+        """Run ``fn(job, *args, **kwargs)`` in the background and return the job."""
+        app = current_app._get_current_object()
+        state = self._state
+        store = state['store']
+        job = Job(name, store, total=total)
+
+        with state['lock']:
+            if state['executor'] is None:
+                state['executor'] = ThreadPoolExecutor(
+                    max_workers=app.config['JOB_WORKERS'], thread_name_prefix='talatrivia-job')
+        store.add(job)
+
+        def run():
+            with app.app_context():
+                job.status = 'running'
+                store.save(job)
+                try:
+                    job.result = fn(job, *args, **kwargs)
+                except Exception as exc:
+                    app.logger.exception("Job %s (%s) failed", job.id, name)
+                    job.status = 'failed'
+                    job.error = str(exc)
+                else:
+                    job.status = 'done'
+                store.save(job)
+
+        state['executor'].submit(run)
+        return job
+
+    def get(self, job_id):
+        """The progress of a job as a dict, or ``None``."""
+        return self._state['store'].get(job_id)
+
+    def interrupt(self, pid):
+        """Mark the unfinished jobs of the dead process ``pid`` as failed."""
+        self._state['store'].interrupt(pid)
+
+    def shutdown(self):
+        """Wait for the running and queued jobs (before the process exits)."""
+        state = self._state
+        with state['lock']:
+            executor, state['executor'] = state['executor'], None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+jobs = JobRunner()
@@ -0,0 +1,34 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (``JSON_PROVIDER = 'orjson'``).
+
+    Keys are sorted like the default provider and dates still go through
+    ``default`` (HTTP dates). Non-ASCII text is written as UTF-8 instead of
+    ``\\u`` escapes, which is equivalent JSON but not byte-identical.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj, indent=kwargs.get('indent')).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self._dumps(obj, indent=indent) + b'\n', mimetype=self.mimetype
+        )
+
+    def _dumps(self, obj, indent=None):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
@@ -0,0 +1,76 @@
+import bisect
+import threading
+from datetime import datetime
+
+
+class Leaderboard:
+    """Sorted index of the completed participations of a trivia.
+
+    Entries are ordered by score descending, then by ``completed_at`` (who
+    finished first) and finally by participation id, so ties always break the
+    same way. Ranks are found with a binary search and pages are slices.
+    """
+
+    def __init__(self):
+        self._keys = []     # sorted (-score, completed_at, participation_id)
+        self._entries = {}  # participation_id -> (key, user name)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, participation_id, score, completed_at, user):
+        """Insert a completed participation and return its rank (1-based)."""
+        key = self.key(participation_id, score, completed_at)
+        with self._lock:
+            if participation_id in self._entries:
+                return self._rank(self._entries[participation_id][0])
+            self._entries[participation_id] = (key, user)
+            bisect.insort(self._keys, key)
+            return self._rank(key)
+
+    def rank(self, participation_id):
+        """Return ``(rank, entry)`` for a participation, or ``None``."""
+        with self._lock:
+            if participation_id not in self._entries:
+                return None
+            key = self._entries[participation_id][0]
+            rank = self._rank(key)
+            return rank, self._entry(key, rank)
+
+    def page(self, limit=None, after=None):
+        """Return ``(entries, next_cursor)`` starting after participation ``after``.
+
+        Raises ``KeyError`` when ``after`` is not on the board.
+        """
+        with self._lock:
+            start = 0
+            if after is not None:
+                start = bisect.bisect_right(self._keys, self._entries[after][0])
+            end = len(self._keys) if limit is None else min(start + limit, len(self._keys))
+            entries = [self._entry(self._keys[i], i + 1) for i in range(start, end)]
+            next_cursor = self._keys[end - 1][2] if entries and end < len(self._keys) else None
+            return entries, next_cursor
+
+    def snapshot(self, limit):
+        """Return ``(entries, keys, total)`` for the top ``limit`` entries."""
+        with self._lock:
+            keys = self._keys[:limit]
+            entries = [self._entry(key, i + 1) for i, key in enumerate(keys)]
+            return entries, keys, len(self._keys)
+
+    @staticmethod
+    def key(participation_id, score, completed_at):
+        return (-score, completed_at or datetime.max, participation_id)
+
+    def _rank(self, key):
+        return bisect.bisect_left(self._keys, key) + 1
+
+    def _entry(self, key, rank):
+        neg_score, completed_at, participation_id = key
+        return {
+            "rank": rank,
+            "user": self._entries[participation_id][1],
+            "score": -neg_score,
+            "completed_at": None if completed_at == datetime.max else completed_at
+        }
@@ -27,15 +27,16 @@ class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(500), nullable=False)
     difficulty = db.Column(db.Enum(Difficulty), nullable=False)
+    tag = db.Column(db.String(50), nullable=True, index=True) # Sampling pools (see app/sampling.py)
     
     # Relationships
-    options = db.relationship('Option', back_populates='question', cascade='all, delete-orphan')
+    options = db.relationship('Option', back_populates='question', cascade='all, delete-orphan', passive_deletes=True)
     trivias = db.relationship('TriviaQuestion', back_populates='question')
 
 class Option(db.Model):
     __tablename__ = 'options'
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False, index=True)
     text = db.Column(db.String(200), nullable=False)
     is_correct = db.Column(db.Boolean, default=False)
     
@@ -47,40 +48,102 @@ class Trivia(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # {"EASY": 5, "MEDIUM": 3, "HARD": 2, "tag": "X"}: questions drawn per player instead of trivia_questions
+    sampling_rule = db.Column(db.JSON(none_as_null=True), nullable=True)
+    # Soft delete: hidden everywhere while its rows are purged in the background (see app/deletion.py)
+    deleted_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
-    questions = db.relationship('TriviaQuestion', back_populates='trivia', cascade='all, delete-orphan')
-    participations = db.relationship('TriviaParticipation', back_populates='trivia')
+    questions = db.relationship('TriviaQuestion', back_populates='trivia', cascade='all, delete-orphan', passive_deletes=True)
+    participations = db.relationship('TriviaParticipation', back_populates='trivia', passive_deletes=True)
 
 class TriviaQuestion(db.Model):
     __tablename__ = 'trivia_questions'
-    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id'), primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id', ondelete='CASCADE'), primary_key=True)
+    # The primary key covers lookups by trivia; this one covers lookups by question
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, index=True)
     
     trivia = db.relationship('Trivia', back_populates='questions')
     question = db.relationship('Question', back_populates='trivias')
 
 class TriviaParticipation(db.Model):
     __tablename__ = 'trivia_participations'
+    __table_args__ = (
+        # Player lookups filter by (trivia_id, user_id); a user is assigned once
+        db.UniqueConstraint('trivia_id', 'user_id', name='uq_trivia_participations_trivia_user'),
+        # Ranking: filter by (trivia_id, completed), order by score; covers completed_at and user_id
+        db.Index('ix_trivia_participations_ranking', 'trivia_id', 'completed', 'score', 'completed_at', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True) # /my-trivias
+    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id', ondelete='CASCADE'), nullable=False)
     score = db.Column(db.Integer, default=0)
     completed = db.Column(db.Boolean, default=False)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)    
+    # Highest question id when assigned: sampled trivias only draw from questions up to it (see app/sampling.py)
+    question_id_limit = db.Column(db.Integer, nullable=True)
     
     user = db.relationship('User', back_populates='participations')
     trivia = db.relationship('Trivia', back_populates='participations')
-    answers = db.relationship('UserAnswer', back_populates='participation')
+    answers = db.relationship('UserAnswer', back_populates='participation', passive_deletes=True)
 
 class UserAnswer(db.Model):
     __tablename__ = 'user_answers'
+    __table_args__ = (
+        # One answer per question and participation; also covers lookups by participation
+        db.UniqueConstraint('participation_id', 'question_id', name='uq_user_answers_participation_question'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    participation_id = db.Column(db.Integer, db.ForeignKey('trivia_participations.id'), nullable=False)
-    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
-    selected_option_id = db.Column(db.Integer, db.ForeignKey('options.id'), nullable=False)
+    participation_id = db.Column(db.Integer, db.ForeignKey('trivia_participations.id', ondelete='CASCADE'), nullable=False)
+    # With foreign keys enforced, deleting a question or option looks up its answers:
+    # without these indexes every such delete scans user_answers
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False, index=True)
+    selected_option_id = db.Column(db.Integer, db.ForeignKey('options.id', ondelete='CASCADE'), nullable=False, index=True)
     is_correct = db.Column(db.Boolean, default=False)
     points_awarded = db.Column(db.Integer, default=0)
     
     participation = db.relationship('TriviaParticipation', back_populates='answers')
+
+# --- Aggregates maintained by submit_trivia (see app/stats.py) ---
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+class OptionStats(db.Model):
+    __tablename__ = 'option_stats'
+    option_id = db.Column(db.Integer, db.ForeignKey('options.id', ondelete='CASCADE'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False, index=True)
+    picks = db.Column(db.Integer, nullable=False, default=0)
+
+class TriviaStats(db.Model):
+    __tablename__ = 'trivia_stats'
+    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id', ondelete='CASCADE'), primary_key=True)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.Integer, nullable=False, default=0)
+
+class TriviaDifficultyStats(db.Model):
+    __tablename__ = 'trivia_difficulty_stats'
+    trivia_id = db.Column(db.Integer, db.ForeignKey('trivias.id', ondelete='CASCADE'), primary_key=True)
+    difficulty = db.Column(db.Enum(Difficulty), primary_key=True)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.Integer, nullable=False, default=0)
+
+    # Global leaderboard order (GET /leaderboard)
+    __table_args__ = (db.Index('ix_user_stats_leaderboard', total_score.desc(), user_id),)
+
+class UserDifficultyStats(db.Model):
+    __tablename__ = 'user_difficulty_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    difficulty = db.Column(db.Enum(Difficulty), primary_key=True)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
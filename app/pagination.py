@@ -0,0 +1,69 @@
+from flask import current_app, jsonify, request, stream_with_context
+from .extensions import db
+from .instrumentation import timer
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def listing_response(serializer, *criteria):
+    """Build the response of a listing endpoint from a compiled ``serializer``.
+
+    - ``?after_id=&limit=``: keyset pagination on the primary key. When the page
+      is full, the cursor for the next page comes in ``X-Next-Cursor``.
+    - ``?stream=ndjson|json``: rows are read from the cursor with ``yield_per``
+      and written out as they are serialized instead of building a list.
+
+    ``criteria`` are extra WHERE clauses (e.g. hiding soft-deleted rows).
+    """
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    stream = request.args.get('stream')
+
+    pk = serializer.columns[serializer.pk_index]
+    stmt = serializer.select().where(*criteria).order_by(pk)
+    if after_id is not None:
+        stmt = stmt.where(pk > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    if stream:
+        if stream not in STREAM_MIMETYPES:
+            return jsonify({"message": "Formato de streaming no soportado"}), 400
+        stmt = stmt.execution_options(yield_per=current_app.config['STREAM_YIELD_PER'])
+        return current_app.response_class(
+            stream_with_context(_stream_rows(stmt, serializer, stream)),
+            mimetype=STREAM_MIMETYPES[stream]
+        )
+
+    rows = db.session.execute(stmt).all()
+    with timer('ser_time'):
+        response = jsonify(serializer.dump_rows(rows))
+    if limit is not None and rows and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = str(serializer.row_id(rows[-1]))
+    return response
+
+
+def _stream_rows(stmt, serializer, fmt):
+    def dumps(item):
+        return current_app.json.dumps(item, separators=(',', ':'))
+
+    # One partition per yield_per batch, serialized as a batch
+    partitions = db.session.execute(stmt).partitions()
+
+    if fmt == 'ndjson':
+        for rows in partitions:
+            yield ''.join(dumps(item) + '\n' for item in serializer.dump_rows(rows))
+        return
+
+    # Chunked JSON array
+    yield '['
+    separator = ''
+    for rows in partitions:
+        items = serializer.dump_rows(rows)
+        if items:
+            yield separator + ','.join(dumps(item) for item in items)
+            separator = ','
+    yield ']\n'
@@ -0,0 +1,329 @@
+"""Response cache for the read-heavy public endpoints, invalidated by versions.
+
+Each cached view depends on named tables (``users``, ``questions``,
+``trivias``, ``ranking:<trivia_id>``) that have a version counter. The write
+endpoints bump the counters of what they change once their transaction has
+committed (``@response_cache.bumps``, or ``response_cache.bump`` where the
+commit happens elsewhere, e.g. ``submissions.save_submissions``). A cached
+response is tagged with the versions read *before* running the view, so an
+entry built from data older than the latest bump can never be served: there
+is no TTL to tune.
+
+``RESPONSE_CACHE_BACKEND`` selects where entries and versions live:
+
+- ``local`` (default): an in-process LRU of ``RESPONSE_CACHE_SIZE`` entries.
+  Only the writes of the same process are seen, so ``python -m app.serve``
+  starts a single worker with it.
+- ``file``: a SQLite file (``RESPONSE_CACHE_FILE``, by default named after
+  the database in the temp directory) shared by the worker processes of one
+  host, so a write handled by one worker invalidates the entries of every
+  worker. Entries beyond ``RESPONSE_CACHE_SIZE`` are evicted
+  oldest first. The production default.
+- ``none``: disabled.
+- a dotted import path (``package.module:Class``) to plug in another backend
+  with the same interface, including the ``shared`` attribute.
+
+Responses carry a content-based ``ETag``, a ``Last-Modified`` taken from the
+latest bump and ``X-Cache: HIT|MISS``; conditional requests get ``304``. Only
+``200`` responses up to ``RESPONSE_CACHE_MAX_ENTRY_SIZE`` bytes are stored
+(not streams). Writes made outside the endpoints (``seed.py``, scripts) are
+not versioned: ``python -m app.serve`` clears the shared entries on start.
+Hit/miss counters are exported at ``/metrics`` when instrumentation is on.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request
+from werkzeug.utils import import_string
+from .cache import TTLCache
+from .cache_sync import ConnectionPool
+from .database import scratch_file
+from .instrumentation import instrumentation
+
+Entry = namedtuple('Entry', 'versions body headers etag')
+
+# Not replayed from a stored response
+SKIPPED_HEADERS = {'Content-Length', 'Set-Cookie'}
+
+
+class LocalResponseCache:
+    """In-process LRU of entries and version counters."""
+
+    shared = False
+
+    def __init__(self, app):
+        self.entries = TTLCache(app.config['RESPONSE_CACHE_SIZE'])
+        self.created_at = time.time()
+        self._versions = {}  # name -> (version, bumped_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def versions(self, names):
+        """``(version, bumped_at)`` of each table in ``names``."""
+        return [self._versions.get(name, (0, self.created_at)) for name in names]
+
+    def bump(self, names):
+        """Increment the versions of ``names`` and return the new ones."""
+        now = time.time()
+        bumped = []
+        with self._lock:
+            for name in names:
+                version = self._versions.get(name, (0, None))[0] + 1
+                self._versions[name] = (version, now)
+                bumped.append(version)
+        return bumped
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries.set(key, entry)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FileResponseCache:
+    """Entries and version counters in a SQLite file shared by the workers of one host.
+
+    Connections are pooled per process (a connection must not cross a fork).
+    The file is a cache: writes are not synced to disk.
+    """
+
+    shared = True
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+        'bumped_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, versions TEXT NOT NULL, '
+        'body BLOB NOT NULL, headers TEXT NOT NULL, etag TEXT NOT NULL, stored_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_entries_stored_at ON entries (stored_at)',
+    )
+    # Version of the tables never bumped: the creation time of the file
+    ORIGIN = '*'
+
+    def __init__(self, app):
+        self.path = app.config['RESPONSE_CACHE_FILE'] or scratch_file(app, 'talatrivia-response-cache.sqlite')
+        self.maxsize = app.config['RESPONSE_CACHE_SIZE']
+        self.pool = ConnectionPool(self.path)
+        with self.pool.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.execute('INSERT OR IGNORE INTO versions VALUES (?, 0, ?)', (self.ORIGIN, time.time()))
+
+    def __len__(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT count(*) FROM entries').fetchone()[0]
+
+    def versions(self, names):
+        with self.pool.connection() as conn:
+            rows = dict((name, (version, bumped_at)) for name, version, bumped_at in conn.execute(
+                f'SELECT name, version, bumped_at FROM versions WHERE name IN ({",".join("?" * (len(names) + 1))})',
+                (self.ORIGIN, *names)))
+        origin = (0, rows[self.ORIGIN][1])
+        return [rows.get(name, origin) for name in names]
+
+    def bump(self, names):
+        now = time.time()
+        with self.pool.connection() as conn:
+            return [conn.execute(
+                'INSERT INTO versions VALUES (?, 1, ?) ON CONFLICT (name) DO UPDATE '
+                'SET version = version + 1, bumped_at = excluded.bumped_at RETURNING version',
+                (name, now)).fetchone()[0] for name in names]
+
+    def get(self, key):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT versions, body, headers, etag FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        versions, body, headers, etag = row
+        return Entry(json.loads(versions), body, [tuple(header) for header in json.loads(headers)], etag)
+
+    def set(self, key, entry):
+        with self.pool.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, json.dumps(entry.versions), entry.body, json.dumps(entry.headers), entry.etag,
+                          time.time()))
+            conn.execute('DELETE FROM entries WHERE key IN '
+                         '(SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+
+    def clear(self):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM entries')
+
+
+BACKENDS = {
+    'local': LocalResponseCache,
+    'file': FileResponseCache,
+    'none': None,
+}
+
+RESULTS = ('hit', 'miss', 'bypass')
+
+
+class ResponseCache:
+    """Extension exposing the configured backend and the view decorators."""
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        cls = BACKENDS[backend] if backend in BACKENDS else import_string(backend)
+        app.extensions['response_cache'] = {
+            'backend': cls(app) if cls is not None else None,
+            'max_entry_size': app.config['RESPONSE_CACHE_MAX_ENTRY_SIZE'],
+            # Shared backends: version of each table this process's own caches match
+            'seen': {},
+            'counts': Counter(),
+            'lock': threading.Lock(),
+        }
+        instrumentation.add_collector(app, self._metrics)
+
+    @property
+    def _state(self):
+        return current_app.extensions['response_cache']
+
+    @property
+    def shared(self):
+        """Whether the bumps of this process reach the entries of the others (trivially when disabled)."""
+        backend = self._state['backend']
+        return backend is None or backend.shared
+
+    def bump(self, *tables):
+        """Invalidate the cached responses built from ``tables`` (call after committing)."""
+        state = self._state
+        backend = state['backend']
+        if backend is None or not tables:
+            return
+        seen = state['seen']
+        for name, version in zip(tables, backend.bump(tables)):
+            # Still in sync only if nobody else bumped in between
+            if seen.get(name) == version - 1:
+                seen[name] = version
+
+    def clear(self):
+        backend = self._state['backend']
+        if backend is not None:
+            backend.clear()
+
+    def bumps(self, *tables):
+        """Decorate a write view to bump ``tables`` once it returns.
+
+        ``tables`` may use the view arguments, e.g. ``'ranking:{id}'``. The
+        bump also happens on errors: a view may have committed part of its
+        work (e.g. some batches of a bulk import) before failing.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    self.bump(*(table.format(**kwargs) for table in tables))
+            return wrapper
+        return decorator
+
+    def cached(self, *tables, on_change=None):
+        """Decorate a public GET view to cache its responses until ``tables`` are bumped.
+
+        With a shared backend, ``on_change(**view_args)`` is called when
+        another process bumped one of ``tables``, to drop per-process state
+        the view reads from (e.g. the in-memory leaderboards).
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                state = self._state
+                backend = state['backend']
+                if backend is None:
+                    return view(*args, **kwargs)
+
+                names = [table.format(**kwargs) for table in tables]
+                versions = backend.versions(names)
+                tag = [version for version, _ in versions]
+                if on_change is not None and backend.shared:
+                    self._sync(state, names, tag, on_change, kwargs)
+
+                key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+                entry = backend.get(key)
+                if entry is not None and entry.versions == tag:
+                    result = 'hit'
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    body = None if response.status_code != 200 or response.is_streamed else response.get_data()
+                    if body is None or len(body) > state['max_entry_size']:
+                        self._count(state, 'bypass')
+                        return response
+                    entry = Entry(tag, body,
+                                  [(k, v) for k, v in response.headers if k not in SKIPPED_HEADERS],
+                                  hashlib.sha1(body).hexdigest())
+                    backend.set(key, entry)
+                    result = 'miss'
+
+                response = current_app.response_class(entry.body, headers=entry.headers)
+                response.set_etag(entry.etag)
+                response.last_modified = datetime.fromtimestamp(max(bumped_at for _, bumped_at in versions),
+                                                                timezone.utc)
+                response.headers['X-Cache'] = result.upper()
+                response.make_conditional(request)
+                self._count(state, result, response.status_code == 304)
+                return response
+            return wrapper
+        return decorator
+
+    def _sync(self, state, names, tag, on_change, kwargs):
+        seen = state['seen']
+        if any(seen.get(name) != version for name, version in zip(names, tag)):
+            on_change(**kwargs)
+            seen.update(zip(names, tag))
+
+    def _count(self, state, result, not_modified=False):
+        with state['lock']:
+            state['counts'][request.endpoint, result] += 1
+            if not_modified:
+                state['counts'][request.endpoint, 'not_modified'] += 1
+
+    def _metrics(self):
+        state = self._state
+        with state['lock']:
+            counts = dict(state['counts'])
+        endpoints = sorted({endpoint for endpoint, _ in counts})
+        lines = [
+            '# HELP talatrivia_response_cache_requests_total Response cache lookups by result.',
+            '# TYPE talatrivia_response_cache_requests_total counter',
+        ]
+        for endpoint in endpoints:
+            for result in RESULTS:
+                lines.append(f'talatrivia_response_cache_requests_total{{endpoint="{endpoint}",result="{result}"}} '
+                             f'{counts.get((endpoint, result), 0)}')
+        lines += [
+            '# HELP talatrivia_response_cache_not_modified_total Cached responses answered with 304.',
+            '# TYPE talatrivia_response_cache_not_modified_total counter',
+        ]
+        for endpoint in endpoints:
+            lines.append(f'talatrivia_response_cache_not_modified_total{{endpoint="{endpoint}"}} '
+                         f'{counts.get((endpoint, "not_modified"), 0)}')
+        lines += [
+            '# HELP talatrivia_response_cache_hit_ratio Hits over hits and misses since the process started.',
+            '# TYPE talatrivia_response_cache_hit_ratio gauge',
+        ]
+        for endpoint in endpoints:
+            hits, misses = counts.get((endpoint, 'hit'), 0), counts.get((endpoint, 'miss'), 0)
+            if hits + misses:
+                lines.append(f'talatrivia_response_cache_hit_ratio{{endpoint="{endpoint}"}} '
+                             f'{hits / (hits + misses):.4f}')
+        if state['backend'] is not None:
+            lines += [
+                '# HELP talatrivia_response_cache_entries Entries stored in the response cache.',
+                '# TYPE talatrivia_response_cache_entries gauge',
+                f'talatrivia_response_cache_entries {len(state["backend"])}',
+            ]
+        return lines
+
+
+response_cache = ResponseCache()
@@ -1,46 +1,66 @@
-from flask import Blueprint, request, jsonify
-from .extensions import db, jwt
-from .models import User, Question, Option, Trivia, TriviaQuestion, TriviaParticipation, UserAnswer, Difficulty, UserRole
-from .schemas import UserSchema, QuestionSchema, TriviaSchema, RankingSchema
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, abort, current_app, request, jsonify, stream_with_context
+from .extensions import db
+from .models import User, Question, Option, Trivia, Difficulty, UserRole
+from .assignment import assign, assign_questions, count_users_by_role
+from .jobs import jobs
+from .hashing import password_hasher, Overloaded
+from .submissions import submission_writer, CommitPending
+from .idempotency import idempotent
+from .streams import ranking_events
+from .stats import question_stats, trivia_stats, leaderboard_page, player_profile
+from .export import export_response, MIMETYPES as EXPORT_FORMATS
+from .deletion import (delete_question_cascade, delete_trivia_cascade, soft_delete_trivia, purge_trivia,
+                       participant_ids)
+from .database import read_only
+from .pagination import listing_response
+from .response_cache import response_cache
+from .serializers import get_schema, user_serializer, question_serializer, trivia_serializer
+from .cache import (answer_keys, play_payloads, question_banks, question_pools, leaderboards, assignments,
+                    invalidate_trivias, invalidate_questions, trivias_for_questions)
+from .sampling import parse_rule, missing_questions, draw
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import datetime
 
 main_bp = Blueprint('main', __name__)
 
-# Schemas
-user_schema = UserSchema()
-users_schema = UserSchema(many=True)
-question_schema = QuestionSchema()
-questions_schema = QuestionSchema(many=True)
-trivia_schema = TriviaSchema()
-trivias_schema = TriviaSchema(many=True)
+
+@main_bp.errorhandler(Overloaded)
+def handle_overloaded(exc):
+    response = jsonify({"message": "Servidor ocupado, intenta nuevamente"})
+    response.headers['Retry-After'] = str(exc.retry_after)
+    return response, 503
 
 # --- Auth ---
 @main_bp.route('/auth/register', methods=['POST'])
+@response_cache.bumps('users')
 def register():
     data = request.get_json()
+    # Hash before touching the database so no connection is held during the KDF
+    password_hash = password_hasher.generate(data['password']) if 'password' in data else None
+    
     if User.query.filter_by(email=data['email']).first():
         return jsonify({"message": "El correo electrónico ya existe"}), 400
     
     user = User(
         name=data['name'], 
         email=data['email'],
-        role=UserRole(data.get('role', 'player'))
+        role=UserRole(data.get('role', 'player')),
+        password_hash=password_hash
     )
-    if 'password' in data:
-        user.password_hash = generate_password_hash(data['password'])
     
     db.session.add(user)
     db.session.commit()
-    return user_schema.dump(user), 201
+    return get_schema('UserSchema').dump(user), 201
 
 @main_bp.route('/auth/login', methods=['POST'])
+@read_only
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
+    # Give the connection back before the KDF; the loaded attributes stay usable
+    db.session.close()
     
-    if user and user.password_hash and check_password_hash(user.password_hash, data['password']):
+    if user and user.password_hash and password_hasher.check(user.password_hash, data['password']):
         token = create_access_token(identity=str(user.id))
         return jsonify({"access_token": token, "user_id": user.id, "role": user.role.value})
     
@@ -48,20 +68,29 @@ def login():
 
 # --- Users ---
 @main_bp.route('/users', methods=['GET'])
+@read_only
+@response_cache.cached('users')
 def get_users():
-    users = User.query.all()
-    return jsonify(users_schema.dump(users))
+    return listing_response(user_serializer)
+
+@main_bp.route('/users/<int:id>/profile', methods=['GET'])
+@read_only
+def get_user_profile(id):
+    # Completions, points, global rank and accuracy per difficulty, from the per-player rollups
+    user = User.query.get_or_404(id)
+    return jsonify(player_profile(user))
 
 # --- Questions ---
 @main_bp.route('/questions', methods=['POST'])
+@response_cache.bumps('questions')
 def create_question():
     data = request.get_json()
-    # data: {text, difficulty: "EASY", options: [{text, is_correct}]}
+    # data: {text, difficulty: "EASY", tag: "X" (optional), options: [{text, is_correct}]}
     
     diff_map = {'EASY': Difficulty.EASY, 'MEDIUM': Difficulty.MEDIUM, 'HARD': Difficulty.HARD}
     difficulty = diff_map.get(data['difficulty'].upper(), Difficulty.EASY)
     
-    question = Question(text=data['text'], difficulty=difficulty)
+    question = Question(text=data['text'], difficulty=difficulty, tag=data.get('tag'))
     db.session.add(question)
     db.session.flush() # get ID
     
@@ -74,108 +103,228 @@ def create_question():
         db.session.add(opt)
     
     db.session.commit()
-    return question_schema.dump(question), 201
+    # SQLite may reuse the id of a deleted question still referenced by a trivia
+    invalidate_questions(question.id)
+    return get_schema('QuestionSchema').dump(question), 201
+
+@main_bp.route('/questions/bulk', methods=['POST'])
+@response_cache.bumps('questions')
+def import_question_bank():
+    # Streamed body, one question per NDJSON line or CSV row (?format=csv or Content-Type: text/csv)
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"message": "Formato no soportado"}), 400
+    
+    # The importer validates with marshmallow: loaded on the first import, not at startup
+    from .importer import UnreadableBody, body_lines, import_questions, iter_csv, iter_ndjson
+    lines = body_lines(request.stream)
+    rows = iter_csv(lines) if fmt == 'csv' else iter_ndjson(lines)
+    try:
+        result = import_questions(rows, batch_size=current_app.config['QUESTION_IMPORT_BATCH_SIZE'])
+    except UnreadableBody as exc:
+        # The rows before the unreadable line were imported: report them too
+        return jsonify({"message": f"No se pudo leer el cuerpo desde la línea {exc.line}", **exc.result}), 400
+    return jsonify(result), 200
 
 @main_bp.route('/questions', methods=['GET'])
+@read_only
+@response_cache.cached('questions')
 def list_questions():
-    questions = Question.query.all()
-    return jsonify(questions_schema.dump(questions))
+    return listing_response(question_serializer)
+
+@main_bp.route('/questions/<int:id>/stats', methods=['GET'])
+@read_only
+def get_question_stats(id):
+    # Correct rate and pick distribution, read from the aggregates tables
+    Question.query.get_or_404(id)
+    return jsonify(question_stats(id))
 
 @main_bp.route('/questions/<int:id>', methods=['DELETE'])
+@response_cache.bumps('questions')
 def delete_question(id):
-    question = Question.query.get_or_404(id)
-    db.session.delete(question)
+    Question.query.get_or_404(id)
+    trivia_ids = trivias_for_questions(id)
+    # Set-based deletes of options, answers and trivia links; nothing is loaded
+    delete_question_cascade(id)
     db.session.commit()
+    question_pools.clear()
+    invalidate_trivias(*trivia_ids)
     return jsonify({"message": "Pregunta eliminada"}), 200
 
 # --- Trivias ---
 @main_bp.route('/trivias', methods=['POST'])
+@response_cache.bumps('trivias')
 def create_trivia():
     data = request.get_json()
-    # data: {name, description, question_ids: [], user_ids: []}
+    # data: {name, description, question_ids: [] or sampling_rule: {"EASY": 5, "tag": "X"},
+    #        user_ids: [], assign: {role: "player"}, background: false}
     
-    trivia = Trivia(name=data['name'], description=data.get('description'))
+    sampling_rule = None
+    if data.get('sampling_rule'):
+        if data.get('question_ids'):
+            return jsonify({"message": "Usa question_ids o sampling_rule, no ambos"}), 400
+        try:
+            sampling_rule = parse_rule(data['sampling_rule'])
+        except ValueError as exc:
+            return jsonify({"message": str(exc)}), 400
+        missing = missing_questions(sampling_rule, question_pools.get(sampling_rule.get('tag')))
+        if missing:
+            return jsonify({"message": "No hay suficientes preguntas para la regla de muestreo",
+                            "missing": missing}), 400
+    
+    role = None
+    if data.get('assign'):
+        try:
+            role = UserRole(data['assign'].get('role'))
+        except ValueError:
+            return jsonify({"message": "Rol inválido"}), 400
+    
+    trivia = Trivia(name=data['name'], description=data.get('description'), sampling_rule=sampling_rule)
     db.session.add(trivia)
     db.session.flush()
     
     # Associate Questions
-    for q_id in data.get('question_ids', []):
-        assoc = TriviaQuestion(trivia_id=trivia.id, question_id=q_id)
-        db.session.add(assoc)
-        
-    # Associate Users (Participation)
-    for u_id in data.get('user_ids', []):
-        part = TriviaParticipation(trivia_id=trivia.id, user_id=u_id)
-        db.session.add(part)
-        
+    assign_questions(trivia.id, data.get('question_ids', []))
     db.session.commit()
-    return trivia_schema.dump(trivia), 201
+    
+    # Associate Users (Participation) with bulk inserts, committed in chunks
+    user_ids = data.get('user_ids', [])
+    chunk_size = current_app.config['TRIVIA_ASSIGN_CHUNK_SIZE']
+    
+    if data.get('background'):
+        total = len(set(user_ids)) + (count_users_by_role(role) if role else 0)
+        job = jobs.submit('assign_users', assign, trivia.id, user_ids, role, chunk_size, total=total)
+        result = get_schema('TriviaSchema').dump(trivia)
+        result['job_id'] = job.id
+        return result, 202
+    
+    assign(None, trivia.id, user_ids, role, chunk_size)
+    return get_schema('TriviaSchema').dump(trivia), 201
 
 @main_bp.route('/trivias', methods=['GET'])
+@read_only
+@response_cache.cached('trivias')
 def list_trivias():
-    trivias = Trivia.query.all()
-    return jsonify(trivias_schema.dump(trivias))
+    return listing_response(trivia_serializer, Trivia.deleted_at.is_(None))
+
+def get_trivia_or_404(id):
+    # Soft-deleted trivias are gone for every endpoint while they are purged
+    return db.first_or_404(db.select(Trivia).where(Trivia.id == id, Trivia.deleted_at.is_(None)))
+
+@main_bp.route('/trivias/<int:id>/stats', methods=['GET'])
+@read_only
+def get_trivia_stats(id):
+    # Completions, average score and accuracy per difficulty, from the aggregates tables
+    get_trivia_or_404(id)
+    return jsonify(trivia_stats(id))
+
+@main_bp.route('/trivias/<int:id>/export', methods=['GET'])
+@read_only
+def export_trivia(id):
+    # Full results (one row per answer) streamed as CSV or NDJSON
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": "Formato no soportado"}), 400
+    get_trivia_or_404(id)
+    return export_response(id, fmt)
 
 @main_bp.route('/trivias/<int:id>', methods=['DELETE'])
+@response_cache.bumps('trivias', 'ranking:{id}')
 def delete_trivia(id):
-    trivia = Trivia.query.get_or_404(id)
-    db.session.delete(trivia)
+    get_trivia_or_404(id)
+    user_ids = participant_ids(id)
+    # ?background=true: hide the trivia now and purge its rows in chunks in the background
+    background = request.args.get('background', '').lower() in ('1', 'true')
+    
+    if background:
+        soft_delete_trivia(id)
+    else:
+        delete_trivia_cascade(id)
     db.session.commit()
+    invalidate_trivias(id)
+    assignments.invalidate(*user_ids)
+    
+    if background:
+        job = jobs.submit('purge_trivia', purge_trivia, id, current_app.config['TRIVIA_PURGE_CHUNK_SIZE'],
+                          total=len(user_ids))
+        return jsonify({"message": "Trivia eliminada", "job_id": job.id}), 202
     return jsonify({"message": "Trivia eliminada"}), 200
 
+# --- Jobs ---
+@main_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": "Tarea no encontrada"}), 404
+    return jsonify(job)
+
 # --- Participation ---
 @main_bp.route('/my-trivias', methods=['GET'])
+@read_only
 @jwt_required()
 def my_trivias():
-    current_user_id = get_jwt_identity()
-    participations = TriviaParticipation.query.filter_by(user_id=current_user_id).all()
-    # Return trivias with status
+    current_user_id = int(get_jwt_identity())
+    # Return trivias with status, from the per-user assignment index
     result = []
-    for p in participations:
+    for a in assignments.get(current_user_id)["trivias"].values():
         result.append({
-            "trivia": trivia_schema.dump(p.trivia),
-            "score": p.score,
-            "completed": p.completed
+            "trivia": a["trivia"],
+            "score": a["score"],
+            "completed": a["completed"]
         })
     return jsonify(result)
 
+def current_assignment(trivia_id):
+    """The current user's assignment to ``trivia_id`` (404 if not assigned)."""
+    assignment = assignments.get(int(get_jwt_identity()))["trivias"].get(trivia_id)
+    if assignment is None:
+        abort(404)
+    return assignment
+
+def sampled_questions(assignment):
+    """Question ids drawn for the participation, or None for fixed-list trivias."""
+    rule = assignment["trivia"]["sampling_rule"]
+    if not rule:
+        return None
+    return draw(rule, assignment["participation_id"], question_pools.get(rule.get('tag')),
+                assignment["question_id_limit"])
+
 @main_bp.route('/trivias/<int:trivia_id>/play', methods=['GET'])
+@read_only
 @jwt_required()
 def play_trivia(trivia_id):
-    current_user_id = get_jwt_identity()
-    participation = TriviaParticipation.query.filter_by(trivia_id=trivia_id, user_id=current_user_id).first_or_404()
+    participation = current_assignment(trivia_id)
     
-    if participation.completed:
-        return jsonify({"message": "Ya has completado esta trivia", "score": participation.score})
+    if participation["completed"]:
+        return jsonify({"message": "Ya has completado esta trivia", "score": participation["score"]})
         
-    # Get questions for this trivia
-    trivia_questions = TriviaQuestion.query.filter_by(trivia_id=trivia_id).all()
-    questions_data = []
-    
-    for tq in trivia_questions:
-        q = tq.question
-        # Serialize manually to hide is_correct and difficulty if desired (though difficulty is usually evident)
-        # Requirement: "No les muestres cuál es la respuesta correcta ni la dificultad"
-        opts = [{"id": o.id, "text": o.text} for o in q.options]
-        questions_data.append({
-            "id": q.id,
-            "text": q.text,
-            "options": opts
-            # No difficulty, no checked answer
+    sample = sampled_questions(participation)
+    if sample is not None:
+        # Per-player questions, taken from the trivia's cached question bank
+        bank = question_banks.get(trivia_id)
+        response = jsonify({
+            "trivia": bank["trivia"],
+            "questions": [bank["questions"][q_id] for q_id in sample if q_id in bank["questions"]]
         })
+        response.add_etag()
+        return response.make_conditional(request)
         
-    return jsonify({
-        "trivia": trivia_schema.dump(participation.trivia),
-        "questions": questions_data
-    })
+    # Same pre-serialized payload for every player (no is_correct, no difficulty)
+    body, etag = play_payloads.get(trivia_id)
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 @main_bp.route('/trivias/<int:trivia_id>/submit', methods=['POST'])
 @jwt_required()
+@idempotent
 def submit_trivia(trivia_id):
-    current_user_id = get_jwt_identity()
-    participation = TriviaParticipation.query.filter_by(trivia_id=trivia_id, user_id=current_user_id).first_or_404()
+    current_user_id = int(get_jwt_identity())
+    participation = current_assignment(trivia_id)
+    participation_id = participation["participation_id"]
+    player_name = assignments.get(current_user_id)["name"]
     
-    if participation.completed:
+    if participation["completed"] or submission_writer.is_pending(participation_id):
          return jsonify({"message": "Ya completada"}), 400
 
     data = request.get_json()
@@ -184,62 +333,134 @@ def submit_trivia(trivia_id):
     answers_input = data.get('answers', [])
     total_score = 0
     
+    # Score in memory against the cached answer key: {question_id: (points, correct, options)}
+    answer_key = answer_keys.get(trivia_id)
+    # Sampled trivias only accept the questions drawn for this participation
+    sample = sampled_questions(participation)
+    allowed = set(sample) if sample is not None else answer_key
+    user_answers = []
+    answered = set()
+    
     for ans in answers_input:
         q_id = ans['question_id']
         opt_id = ans['option_id']
         
-        # Verify valid question for this trivia
-        # (omitted for brevity, assume valid inputs from trusted client or add check)
-        
-        question = Question.query.get(q_id)
-        selected_option = Option.query.get(opt_id)
-        
-        if not question or not selected_option:
+        # Only questions of this trivia and options of that question are
+        # accepted, and only the first answer to each question
+        key = answer_key.get(q_id)
+        if key is None or q_id not in allowed or q_id in answered or opt_id not in key[2]:
             continue
+        answered.add(q_id)
             
-        is_correct = selected_option.is_correct and selected_option.question_id == q_id
-        
-        points = 0
-        if is_correct:
-            if question.difficulty == Difficulty.EASY:
-                points = 1
-            elif question.difficulty == Difficulty.MEDIUM:
-                points = 2
-            elif question.difficulty == Difficulty.HARD:
-                points = 3
-        
+        is_correct = opt_id in key[1]
+        points = key[0] if is_correct else 0
         total_score += points
         
-        # Save UserAnswer
-        user_answer = UserAnswer(
-            participation_id=participation.id,
-            question_id=q_id,
-            selected_option_id=opt_id,
-            is_correct=is_correct,
-            points_awarded=points
-        )
-        db.session.add(user_answer)
-        
-    participation.score = total_score
-    participation.completed = True
-    participation.completed_at = datetime.datetime.utcnow() 
+        user_answers.append({
+            "participation_id": participation_id,
+            "question_id": q_id,
+            "selected_option_id": opt_id,
+            "is_correct": is_correct,
+            "points_awarded": points
+        })
     
-    db.session.commit()
+    # Saved inline, or queued for the write-behind writer (SUBMIT_WRITE_BEHIND);
+    # False when a concurrent submit completed the participation first
+    try:
+        saved = submission_writer.save({
+            "participation_id": participation_id,
+            "trivia_id": trivia_id,
+            "user_id": current_user_id,
+            "name": player_name,
+            "score": total_score,
+            "completed_at": datetime.datetime.utcnow(),
+            "answers": user_answers
+        })
+    except CommitPending:
+        # Still queued: retrying would only find it pending
+        return jsonify({"message": "Envío aceptado, pendiente de guardar", "score": total_score}), 202
+    if not saved:
+        return jsonify({"message": "Ya completada"}), 400
     
     return jsonify({"message": "Trivia completada", "score": total_score})
 
 # --- Ranking ---
+def leaderboard_or_404(trivia_id):
+    """The trivia's leaderboard; 404 (and nothing cached) for unknown or deleted trivias."""
+    board = leaderboards.peek(trivia_id)
+    if board is None:
+        # A cached board implies the trivia exists: deleting it invalidates the board
+        get_trivia_or_404(trivia_id)
+        board = leaderboards.get(trivia_id)
+    return board
+
 @main_bp.route('/trivias/<int:trivia_id>/ranking', methods=['GET'])
+@read_only
+# Completions handled by another worker reach this worker's leaderboard through a rebuild
+@response_cache.cached('ranking:{trivia_id}', on_change=lambda trivia_id: leaderboards.invalidate(trivia_id))
 def get_ranking(trivia_id):
-    # Ranking based on score descending
-    participations = TriviaParticipation.query.filter_by(trivia_id=trivia_id, completed=True).order_by(TriviaParticipation.score.desc()).all()
-    
-    ranking_data = []
-    for p in participations:
-        ranking_data.append({
-            "user": p.user.name,
-            "score": p.score,
-            "completed_at": p.completed_at
-        })
+    # Ranking based on score descending, ties broken by who finished first
+    # ?limit=&after=<cursor> pages through it; the next cursor comes in X-Next-Cursor
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"message": "Límite inválido"}), 400
+    
+    try:
+        ranking_data, next_cursor = leaderboard_or_404(trivia_id).page(limit=limit, after=after)
+    except KeyError:
+        return jsonify({"message": "Cursor inválido"}), 400
+        
+    response = jsonify(ranking_data)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+@main_bp.route('/leaderboard', methods=['GET'])
+@read_only
+def get_leaderboard():
+    # All-time ranking across trivias by total points, from the per-player rollups
+    # ?limit=&after=<cursor> pages through it; the next cursor comes in X-Next-Cursor
+    limit = request.args.get('limit', current_app.config['LEADERBOARD_PAGE_SIZE'], type=int)
+    after = request.args.get('after')
+    if limit < 1:
+        return jsonify({"message": "Límite inválido"}), 400
+
+    try:
+        entries, next_cursor = leaderboard_page(limit, after)
+    except ValueError:
+        return jsonify({"message": "Cursor inválido"}), 400
+
+    response = jsonify(entries)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@main_bp.route('/trivias/<int:trivia_id>/ranking/stream', methods=['GET'])
+@read_only
+def stream_ranking(trivia_id):
+    # Server-Sent Events: a snapshot of the top ?limit= entries, then deltas
+    limit = request.args.get('limit', current_app.config['RANKING_STREAM_TOP'], type=int)
+    if limit < 1:
+        return jsonify({"message": "Límite inválido"}), 400
+    leaderboard_or_404(trivia_id)
+    return current_app.response_class(
+        stream_with_context(ranking_events(trivia_id, limit)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@main_bp.route('/trivias/<int:trivia_id>/ranking/me', methods=['GET'])
+@read_only
+@jwt_required()
+def my_ranking(trivia_id):
+    participation = current_assignment(trivia_id)
+    
+    board = leaderboards.get(trivia_id)
+    result = board.rank(participation["participation_id"])
+    if result is None:
+        return jsonify({"message": "Aún no has completado esta trivia"}), 404
         
-    return jsonify(ranking_data)
+    rank, entry = result
+    entry["total"] = len(board)
+    return jsonify(entry)
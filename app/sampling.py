@@ -0,0 +1,108 @@
+"""Per-player question sampling for trivias with a ``sampling_rule``.
+
+A rule such as ``{"EASY": 5, "MEDIUM": 3, "HARD": 2, "tag": "X"}`` replaces
+the fixed list of ``trivia_questions``: every participation gets its own
+questions, drawn from in-memory pools of question ids per difficulty (all
+questions, or only those with ``tag``). Each participation ranks the ids of
+a pool by a hash keyed with its id and takes the first ones, so ``/play``
+and ``/submit`` compute the same sample without storing it and without
+``ORDER BY RANDOM()`` queries. Since the rank of an id does not depend on
+the rest of the pool, only deleting a drawn question changes the sample
+(the next id in the ranking replaces it). Each participation also only
+draws from the questions that existed when it was assigned (ids up to its
+``question_id_limit``), so questions created while it is in progress never
+enter its sample.
+"""
+import heapq
+from bisect import bisect_right
+from array import array
+from .models import Question, Difficulty
+
+TAG_KEY = 'tag'
+
+MASK64 = (1 << 64) - 1
+
+
+def parse_rule(data):
+    """Validate a sampling rule and return it normalized; raises ``ValueError``."""
+    if not isinstance(data, dict):
+        raise ValueError("La regla de muestreo debe ser un objeto")
+    rule = {}
+    for key, value in data.items():
+        if key == TAG_KEY:
+            if value is not None and not isinstance(value, str):
+                raise ValueError("El tag debe ser un texto")
+            if value:
+                rule[TAG_KEY] = value
+            continue
+        if key.upper() not in Difficulty.__members__:
+            raise ValueError(f"Dificultad inválida: {key}")
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"Cantidad inválida para {key}")
+        if value:
+            rule[key.upper()] = value
+    if not any(key in Difficulty.__members__ for key in rule):
+        raise ValueError("La regla de muestreo no pide preguntas")
+    return rule
+
+
+def rule_counts(rule):
+    """``[(difficulty, count)]`` in a stable order."""
+    return [(difficulty, rule[difficulty.name]) for difficulty in Difficulty if rule.get(difficulty.name)]
+
+
+def rule_filter(rule):
+    """WHERE clauses selecting the questions a rule can draw from."""
+    clauses = [Question.difficulty.in_([difficulty for difficulty, _ in rule_counts(rule)])]
+    if rule.get(TAG_KEY):
+        clauses.append(Question.tag == rule[TAG_KEY])
+    return clauses
+
+
+def build_pools(rows):
+    """``{difficulty: array of ids}`` from ``(id, difficulty)`` rows sorted by id."""
+    pools = {}
+    for question_id, difficulty in rows:
+        pools.setdefault(difficulty, array('l')).append(question_id)
+    return pools
+
+
+def missing_questions(rule, pools):
+    """Difficulties whose pool is smaller than the rule asks for, as ``{name: missing}``."""
+    return {
+        difficulty.name: count - len(pools.get(difficulty, ()))
+        for difficulty, count in rule_counts(rule)
+        if len(pools.get(difficulty, ())) < count
+    }
+
+
+def _mix(value):
+    """SplitMix64 finalizer: spreads consecutive integers over 64 bits."""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def _rank_key(participation_id):
+    """Sort key putting question ids in a pseudo-random order of the participation."""
+    seed = _mix(participation_id)
+
+    def key(question_id):
+        value = ((question_id ^ seed) * 0x9E3779B97F4A7C15) & MASK64
+        return ((value ^ (value >> 32)) * 0xD6E8FEB86659FD93) & MASK64
+    return key
+
+
+def draw(rule, participation_id, pools, limit=None):
+    """The question ids of a participation: the first ones of each pool by :func:`_rank_key`.
+
+    Only ids up to ``limit`` are drawn (``None``: the whole pools).
+    """
+    key = _rank_key(participation_id)
+    question_ids = []
+    for difficulty, count in rule_counts(rule):
+        pool = pools.get(difficulty, ())
+        # Pools are sorted by id: the first ``size`` ids are the pinned pool
+        size = len(pool) if limit is None else bisect_right(pool, limit)
+        question_ids.extend(heapq.nsmallest(count, pool[:size], key=key))
+    return question_ids
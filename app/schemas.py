@@ -1,6 +1,17 @@
-from .extensions import ma
-from .models import User, Question, Option, Trivia, TriviaParticipation, UserAnswer
-from marshmallow import fields
+"""Marshmallow schemas for the write endpoints and the cached /play payloads.
+
+Building them imports marshmallow-sqlalchemy and introspects the mappers, so
+this module is only imported on first use, through ``serializers.get_schema``.
+"""
+from flask_marshmallow import Marshmallow
+from .extensions import db
+from .models import User, Question, Option, Trivia, TriviaParticipation, UserAnswer, Difficulty
+from marshmallow import Schema, fields
+
+ma = Marshmallow()
+# What Marshmallow.init_app does for Flask-SQLAlchemy: bind the model schemas
+# to db.session (the same scoped session for every app)
+ma.SQLAlchemyAutoSchema.OPTIONS_CLASS.session = db.session
 
 class UserSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
@@ -29,6 +40,8 @@ class TriviaSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Trivia
         load_instance = True
+        # Soft-deleted trivias are never returned; same fields as serializers.trivia_serializer
+        exclude = ('deleted_at',)
 
 class TriviaDetailSchema(TriviaSchema):
     questions = ma.Nested(QuestionSchema, many=True) # This might need adjustment as it is M2M via TriviaQuestion
@@ -37,3 +50,17 @@ class RankingSchema(ma.Schema):
     user = fields.String(attribute='user.name')
     score = fields.Integer()
     completed = fields.Boolean()
+
+# Plain schemas for bulk validation. They reuse the column fields generated for
+# OptionSchema/QuestionSchema, without the per-call overhead of the
+# load_instance machinery.
+OptionImportSchema = Schema.from_dict({
+    name: OptionSchema._declared_fields[name] for name in ('text', 'is_correct')
+}, name='OptionImportSchema')
+
+QuestionImportSchema = Schema.from_dict({
+    'text': QuestionSchema._declared_fields['text'],
+    'difficulty': fields.Enum(Difficulty, required=True),
+    'tag': QuestionSchema._declared_fields['tag'],
+    'options': fields.List(fields.Nested(OptionImportSchema), load_default=list),
+}, name='QuestionImportSchema')
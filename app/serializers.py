@@ -0,0 +1,120 @@
+"""Compiled serializers for the hot read endpoints.
+
+Each serializer selects plain Core rows and maps them to dicts with a plan
+computed once (key, position, converter), producing the same output as the
+marshmallow schemas in ``schemas.py`` without per-object introspection.
+Those schemas are built on first use (``get_schema``), so processes that never
+dump a model through marshmallow (CLI tasks, migrations) do not import it.
+"""
+from functools import cache
+from itertools import groupby
+from .extensions import db
+from .models import User, Question, Option, Trivia
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _enum_name(value):
+    return value.name
+
+
+@cache
+def get_schema(name, **kwargs):
+    """Shared instance of ``schemas.<name>(**kwargs)``, built on the first call."""
+    from . import schemas
+    return getattr(schemas, name)(**kwargs)
+
+
+class RowSerializer:
+    """Serialize rows of ``model`` as ``{key: value}`` dicts.
+
+    ``fields`` is a list of ``(key, column name, converter)``; converters are
+    only called for non-null values, like marshmallow fields.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.columns = [getattr(model, column) for _, column, _ in fields]
+        self.keys = tuple(key for key, _, _ in fields)
+        self.converters = tuple(
+            (index, converter) for index, (_, _, converter) in enumerate(fields) if converter
+        )
+        self.pk_index = next(i for i, c in enumerate(self.columns) if c.primary_key)
+
+    def select(self):
+        return db.select(*self.columns)
+
+    def dump_row(self, row):
+        values = list(row)
+        for index, converter in self.converters:
+            if values[index] is not None:
+                values[index] = converter(values[index])
+        return dict(zip(self.keys, values))
+
+    def dump_rows(self, rows):
+        return [self.dump_row(row) for row in rows]
+
+    def row_id(self, row):
+        return row[self.pk_index]
+
+
+class QuestionSerializer(RowSerializer):
+    """Questions with their options nested, fetched with one query per batch."""
+
+    IN_CHUNK_SIZE = 5000
+
+    def __init__(self):
+        super().__init__(Question, [
+            ('id', 'id', None),
+            ('text', 'text', None),
+            ('difficulty', 'difficulty', _enum_name),
+            ('tag', 'tag', None),
+        ])
+        self.options = RowSerializer(Option, [
+            ('id', 'id', None),
+            ('question_id', 'question_id', None),
+            ('text', 'text', None),
+            ('is_correct', 'is_correct', None),
+        ])
+
+    def dump_rows(self, rows):
+        questions = [self.dump_row(row) for row in rows]
+        if not questions:
+            return questions
+
+        by_id = {}
+        for question in questions:
+            question['options'] = []
+            by_id[question['id']] = question
+
+        # Chunked to stay under SQLite's bound parameter limit
+        ids = list(by_id)
+        for start in range(0, len(ids), self.IN_CHUNK_SIZE):
+            option_rows = db.session.execute(
+                self.options.select()
+                .where(Option.question_id.in_(ids[start:start + self.IN_CHUNK_SIZE]))
+                .order_by(Option.question_id, Option.id)
+            )
+            for question_id, group in groupby(option_rows, key=lambda row: row.question_id):
+                by_id[question_id]['options'] = self.options.dump_rows(group)
+        return questions
+
+
+user_serializer = RowSerializer(User, [
+    ('id', 'id', None),
+    ('name', 'name', None),
+    ('email', 'email', None),
+    ('role', 'role', _enum_name),
+])
+
+trivia_serializer = RowSerializer(Trivia, [
+    ('id', 'id', None),
+    ('name', 'name', None),
+    ('description', 'description', None),
+    ('created_at', 'created_at', _isoformat),
+    ('sampling_rule', 'sampling_rule', None),
+])
+
+question_serializer = QuestionSerializer()
@@ -0,0 +1,214 @@
+"""Production entry point: a pre-fork WSGI server.
+
+    python -m app.serve --workers 4 --port 5000
+
+The parent process builds the app once, warms the answer keys and /play data
+of the trivias still being played (``cache.warm``), binds the listening
+socket and forks ``--workers`` processes that accept on it, each running
+Werkzeug's threaded WSGI server. Workers inherit the warm caches; the engines
+are disposed before forking so no SQLite connection crosses a fork. The
+schema is not created here: run ``flask db upgrade`` before starting.
+
+A write only invalidates the in-memory caches and cached responses of the
+worker that handles it, a ranking update only reaches the streams of that
+worker and only that worker knows its background jobs, unless
+``CACHE_SYNC_BACKEND``, ``RESPONSE_CACHE_BACKEND``, ``BROKER_BACKEND`` and
+``JOB_BACKEND`` are shared (``file``, the production defaults), so without
+them a single worker is started.
+
+SIGTERM or SIGINT shuts down gracefully: workers stop accepting, finish the
+requests in flight and the background jobs, and drain the write-behind
+queue; after ``--graceful-timeout`` seconds the stragglers are killed and
+their unfinished jobs reported as failed. A worker that dies is replaced by
+a fresh fork of the warm parent. Shared response cache entries left by a
+previous run are cleared on start.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from werkzeug.serving import make_server
+from . import create_app, db
+from .broker import broker
+from .cache import warm
+from .cache_sync import cache_sync
+from .hashing import password_hasher
+from .jobs import jobs
+from .response_cache import response_cache
+from .submissions import submission_writer
+
+log = logging.getLogger('talatrivia.serve')
+
+SIGNALS = {signal.SIGTERM, signal.SIGINT}
+# Extensions whose state must reach every worker: (setting, extension)
+SHARED_STATE = (
+    ('CACHE_SYNC_BACKEND', cache_sync),
+    ('RESPONSE_CACHE_BACKEND', response_cache),
+    ('BROKER_BACKEND', broker),
+    ('JOB_BACKEND', jobs),
+)
+# A worker that exits sooner than this is restarted after a pause, not in a loop
+MIN_WORKER_LIFETIME = 1.0
+
+
+class Shutdown(Exception):
+    """Raised in the parent by SIGTERM/SIGINT."""
+
+
+def _raise_shutdown(signum, frame):
+    raise Shutdown(signum)
+
+
+def build_app(warm_caches=True):
+    """Create the app and warm its caches; returns ``(app, timings)``."""
+    t0 = time.perf_counter()
+    app = create_app()
+    t1 = time.perf_counter()
+    with app.app_context():
+        trivia_ids = warm() if warm_caches else []
+        # Entries stored by a previous server may predate out-of-band writes (seed, migrations)
+        response_cache.clear()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    t2 = time.perf_counter()
+    return app, {"app_ms": (t1 - t0) * 1000, "warm_ms": (t2 - t1) * 1000, "trivias": len(trivia_ids)}
+
+
+def run_worker(server, app):
+    """Serve until SIGTERM/SIGINT, then finish in-flight requests and pending writes."""
+    # The signals stay blocked (the parent blocked them around fork()) so
+    # that this thread receives them through sigtimedwait(). A thread that
+    # unblocks them (e.g. while starting the hashing pool) may still get
+    # one: the parent's handler would raise Shutdown in the middle of the
+    # shutdown, so it is replaced by one that only records the signal
+    received = []
+    for signum in SIGNALS:
+        signal.signal(signum, lambda signum, frame: received.append(signum))
+    thread = threading.Thread(target=server.serve_forever, name='talatrivia-serve', daemon=True)
+    thread.start()
+    try:
+        while not received and signal.sigtimedwait(SIGNALS, 0.5) is None:
+            pass
+        server.shutdown()
+    finally:
+        try:
+            server.server_close()
+        finally:
+            with app.app_context():
+                jobs.shutdown()
+                submission_writer.drain()
+                password_hasher.shutdown()
+
+
+def spawn(server, app, workers):
+    signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(server, app)
+            except BaseException:
+                log.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+
+def stop(workers, timeout):
+    for pid in workers:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    while workers and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.pop(pid, None)
+        else:
+            time.sleep(0.05)
+    for pid in workers:
+        log.warning("Worker %d did not stop in %ss, killing it", pid, timeout)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def serve(args):
+    t0 = time.perf_counter()
+    app, timings = build_app(warm_caches=not args.no_warm)
+    with app.app_context():
+        unshared = [f'{setting}={app.config[setting]}' for setting, extension in SHARED_STATE
+                    if not extension.shared]
+        if args.workers > 1 and unshared:
+            log.warning("%s does not reach other processes, starting 1 worker instead of %d",
+                        ', '.join(unshared), args.workers)
+            args.workers = 1
+
+    server = make_server(args.host, args.port, app, threaded=True)
+    # Every worker polls the shared socket and all are woken by a connection
+    # that only one of them gets: the others must not block in accept(), or
+    # they miss the shutdown request until the next connection arrives
+    server.socket.setblocking(False)
+    # server_close() joins the request threads instead of abandoning them
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    signal.signal(signal.SIGTERM, _raise_shutdown)
+    signal.signal(signal.SIGINT, _raise_shutdown)
+    workers = {}
+    try:
+        for _ in range(args.workers):
+            spawn(server, app, workers)
+        log.info("Listening on http://%s:%d with %d workers, startup %.0f ms "
+                 "(app %.0f ms, warm %.0f ms, %d trivias)",
+                 args.host, server.server_port, args.workers, (time.perf_counter() - t0) * 1000,
+                 timings["app_ms"], timings["warm_ms"], timings["trivias"])
+
+        while True:
+            pid, status = os.wait()
+            started = workers.pop(pid, None)
+            if started is None:
+                continue
+            with app.app_context():
+                jobs.interrupt(pid)
+            log.warning("Worker %d exited with code %d, starting a new one", pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            spawn(server, app, workers)
+    except Shutdown:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        log.info("Shutting down %d workers", len(workers))
+        pids = list(workers)
+        stop(workers, args.graceful_timeout)
+        with app.app_context():
+            for pid in pids:
+                jobs.interrupt(pid)
+    finally:
+        server.socket.close()
+    log.info("Stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv('WEB_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv('GRACEFUL_TIMEOUT', 10)),
+                        help="seconds to wait for in-flight requests on shutdown")
+    parser.add_argument("--no-warm", action="store_true", help="skip warming the trivia caches")
+    parser.add_argument("--access-log", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    if not args.access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Incremental analytics: per-question, per-option, per-trivia and per-player aggregates.
+
+The counters are upserted in the same transaction that saves the answers
+(``submissions.save_submissions``), so ``GET /questions/<id>/stats`` and
+``GET /trivias/<id>/stats`` read a handful of rows by primary key instead of
+scanning ``user_answers``. ``flask stats backfill`` rebuilds them from the
+history in a single streaming pass.
+
+The per-player rollups (``user_stats`` and ``user_difficulty_stats``) serve
+``GET /leaderboard`` and ``GET /users/<id>/profile``. They only count trivias
+that are not deleted: deleting or hiding a trivia takes its completions out
+(``discount_trivia``), and deleting a question takes its answers out
+(``discount_question``). ``flask stats rebuild-players`` recomputes them in
+chunks of users, one transaction per chunk.
+"""
+from collections import Counter
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .extensions import db
+from .models import (User, Question, Option, Trivia, TriviaParticipation, UserAnswer, QuestionStats, OptionStats,
+                     TriviaStats, TriviaDifficultyStats, UserStats, UserDifficultyStats)
+from .cache import answer_keys
+
+
+def _upsert(model, rows, counters):
+    """Insert ``rows``, adding their ``counters`` to the existing row on conflict."""
+    if not rows:
+        return
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+    )
+    db.session.execute(stmt, rows)
+
+
+def _accuracy(correct, answers):
+    return round(correct / answers, 4) if answers else None
+
+
+class Aggregates:
+    """Counter deltas accumulated in memory and written with one upsert per table."""
+
+    def __init__(self):
+        self.question_answers = Counter()
+        self.question_correct = Counter()
+        self.option_picks = Counter()
+        self.option_question = {}
+        self.trivia_completions = Counter()
+        self.trivia_score = Counter()
+        self.difficulty_answers = Counter()
+        self.difficulty_correct = Counter()
+
+    def add_answer(self, trivia_id, question_id, option_id, is_correct, difficulty):
+        self.question_answers[question_id] += 1
+        self.question_correct[question_id] += is_correct
+        self.option_picks[option_id] += 1
+        self.option_question[option_id] = question_id
+        self.difficulty_answers[trivia_id, difficulty] += 1
+        self.difficulty_correct[trivia_id, difficulty] += is_correct
+
+    def add_completions(self, trivia_id, count, score):
+        self.trivia_completions[trivia_id] += count
+        self.trivia_score[trivia_id] += score
+
+    def save(self):
+        _upsert(QuestionStats, [
+            {"question_id": q_id, "answers": answers, "correct": self.question_correct[q_id]}
+            for q_id, answers in self.question_answers.items()
+        ], ('answers', 'correct'))
+        _upsert(OptionStats, [
+            {"option_id": opt_id, "question_id": self.option_question[opt_id], "picks": picks}
+            for opt_id, picks in self.option_picks.items()
+        ], ('picks',))
+        _upsert(TriviaStats, [
+            {"trivia_id": t_id, "completions": completions, "total_score": self.trivia_score[t_id]}
+            for t_id, completions in self.trivia_completions.items()
+        ], ('completions', 'total_score'))
+        _upsert(TriviaDifficultyStats, [
+            {"trivia_id": t_id, "difficulty": difficulty, "answers": answers,
+             "correct": self.difficulty_correct[t_id, difficulty]}
+            for (t_id, difficulty), answers in self.difficulty_answers.items()
+        ], ('answers', 'correct'))
+
+
+class PlayerAggregates:
+    """Per-user counter deltas (negative when a trivia is discounted)."""
+
+    def __init__(self):
+        self.completions = Counter()
+        self.score = Counter()
+        self.answers = Counter()
+        self.correct = Counter()
+
+    def add_completions(self, user_id, count, score):
+        self.completions[user_id] += count
+        self.score[user_id] += score
+
+    def add_answers(self, user_id, difficulty, answers, correct):
+        self.answers[user_id, difficulty] += answers
+        self.correct[user_id, difficulty] += correct
+
+    def save(self):
+        _upsert(UserStats, [
+            {"user_id": user_id, "completions": completions, "total_score": self.score[user_id]}
+            for user_id, completions in self.completions.items()
+        ], ('completions', 'total_score'))
+        _upsert(UserDifficultyStats, [
+            {"user_id": user_id, "difficulty": difficulty, "answers": answers,
+             "correct": self.correct[user_id, difficulty]}
+            for (user_id, difficulty), answers in self.answers.items()
+        ], ('answers', 'correct'))
+
+
+def record_submissions(submissions):
+    """Add scored submissions to the aggregates (the caller commits)."""
+    aggregates = Aggregates()
+    players = PlayerAggregates()
+    for submission in submissions:
+        trivia_id = submission["trivia_id"]
+        user_id = submission["user_id"]
+        answer_key = answer_keys.get(trivia_id)
+        aggregates.add_completions(trivia_id, 1, submission["score"])
+        players.add_completions(user_id, 1, submission["score"])
+        for answer in submission["answers"]:
+            difficulty = answer_key[answer["question_id"]][3]
+            aggregates.add_answer(trivia_id, answer["question_id"], answer["selected_option_id"],
+                                  answer["is_correct"], difficulty)
+            players.add_answers(user_id, difficulty, 1, answer["is_correct"])
+    aggregates.save()
+    players.save()
+
+
+def _player_totals(*criteria):
+    """``(user_id, completions, score)`` of the completed participations matching ``criteria``."""
+    return db.session.execute(
+        db.select(TriviaParticipation.user_id, db.func.count(),
+                  db.func.coalesce(db.func.sum(TriviaParticipation.score), 0))
+        .where(TriviaParticipation.completed == True, *criteria)
+        .group_by(TriviaParticipation.user_id)
+    )
+
+
+def _player_answers(*criteria):
+    """``(user_id, difficulty, answers, correct)`` of the answers of participations matching ``criteria``."""
+    return db.session.execute(
+        db.select(TriviaParticipation.user_id, Question.difficulty, db.func.count(),
+                  db.func.sum(db.cast(UserAnswer.is_correct, db.Integer)))
+        .join(TriviaParticipation, TriviaParticipation.id == UserAnswer.participation_id)
+        .join(Question, Question.id == UserAnswer.question_id)
+        .where(*criteria)
+        .group_by(TriviaParticipation.user_id, Question.difficulty)
+    )
+
+
+def discount_trivia(trivia_id):
+    """Take a trivia out of the per-player rollups before deleting or hiding it.
+
+    A no-op for a trivia that is already soft-deleted (it was discounted
+    then). Players left without completions drop out of the leaderboard. The
+    caller commits.
+    """
+    trivia = db.session.get(Trivia, trivia_id)
+    if trivia is None or trivia.deleted_at is not None:
+        return
+    players = PlayerAggregates()
+    for user_id, completions, score in _player_totals(TriviaParticipation.trivia_id == trivia_id):
+        players.add_completions(user_id, -completions, -score)
+    for user_id, difficulty, answers, correct in _player_answers(TriviaParticipation.trivia_id == trivia_id):
+        players.add_answers(user_id, difficulty, -answers, -correct)
+    players.save()
+    db.session.execute(db.delete(UserStats).where(
+        UserStats.user_id.in_(db.select(TriviaParticipation.user_id).where(TriviaParticipation.trivia_id == trivia_id)),
+        UserStats.completions <= 0,
+    ))
+
+
+def discount_question(question_id):
+    """Take a question's answers out of the per-difficulty aggregates before deleting it.
+
+    Per trivia for every trivia, per player only for trivias that are not
+    deleted (as ``backfill`` and ``rebuild_players`` count them); rows left
+    without answers are removed. The caller commits.
+    """
+    question = db.session.get(Question, question_id)
+    if question is None:
+        return
+    aggregates = Aggregates()
+    for trivia_id, answers, correct in db.session.execute(
+        db.select(TriviaParticipation.trivia_id, db.func.count(), db.func.sum(db.cast(UserAnswer.is_correct, db.Integer)))
+        .join(TriviaParticipation, TriviaParticipation.id == UserAnswer.participation_id)
+        .where(UserAnswer.question_id == question_id)
+        .group_by(TriviaParticipation.trivia_id)
+    ):
+        aggregates.difficulty_answers[trivia_id, question.difficulty] -= answers
+        aggregates.difficulty_correct[trivia_id, question.difficulty] -= correct
+    players = PlayerAggregates()
+    live = db.select(Trivia.id).where(Trivia.deleted_at.is_(None))
+    for user_id, difficulty, answers, correct in _player_answers(UserAnswer.question_id == question_id,
+                                                                 TriviaParticipation.trivia_id.in_(live)):
+        players.add_answers(user_id, difficulty, -answers, -correct)
+    aggregates.save()
+    players.save()
+    for model in (TriviaDifficultyStats, UserDifficultyStats):
+        db.session.execute(db.delete(model).where(model.difficulty == question.difficulty, model.answers <= 0))
+
+
+def rebuild_players(chunk_size):
+    """Recompute the per-player rollups from the history, ``chunk_size`` user ids per transaction.
+
+    Each chunk starts by emptying its rows, which takes the write lock, so
+    submits of those users wait for the chunk instead of being counted twice
+    or lost; other users keep playing between chunks.
+    """
+    last_id = db.session.scalar(db.select(db.func.max(User.id))) or 0
+    db.session.commit()
+    live = db.select(Trivia.id).where(Trivia.deleted_at.is_(None))
+    players = 0
+    for start in range(0, last_id, chunk_size):
+        first, last = start + 1, start + chunk_size
+        for model in (UserStats, UserDifficultyStats):
+            db.session.execute(db.delete(model).where(model.user_id.between(first, last)))
+        aggregates = PlayerAggregates()
+        criteria = (TriviaParticipation.user_id.between(first, last), TriviaParticipation.trivia_id.in_(live))
+        for user_id, completions, score in _player_totals(*criteria):
+            aggregates.add_completions(user_id, completions, score)
+        for user_id, difficulty, answers, correct in _player_answers(*criteria):
+            aggregates.add_answers(user_id, difficulty, answers, correct)
+        aggregates.save()
+        db.session.commit()
+        players += len(aggregates.completions)
+    return {"players": players, "users": last_id}
+
+
+def question_stats(question_id):
+    stats = db.session.get(QuestionStats, question_id)
+    answers, correct = (stats.answers, stats.correct) if stats else (0, 0)
+    options = db.session.execute(
+        db.select(Option.id, OptionStats.picks)
+        .outerjoin(OptionStats, OptionStats.option_id == Option.id)
+        .where(Option.question_id == question_id)
+        .order_by(Option.id)
+    ).all()
+    return {
+        "question_id": question_id,
+        "answers": answers,
+        "correct": correct,
+        "accuracy": _accuracy(correct, answers),
+        "options": [
+            {"option_id": opt_id, "picks": picks or 0, "pick_rate": _accuracy(picks or 0, answers)}
+            for opt_id, picks in options
+        ]
+    }
+
+
+def trivia_stats(trivia_id):
+    stats = db.session.get(TriviaStats, trivia_id)
+    completions, total_score = (stats.completions, stats.total_score) if stats else (0, 0)
+    by_difficulty = {
+        row.difficulty.name: {"answers": row.answers, "correct": row.correct,
+                              "accuracy": _accuracy(row.correct, row.answers)}
+        for row in db.session.scalars(
+            db.select(TriviaDifficultyStats).where(TriviaDifficultyStats.trivia_id == trivia_id))
+    }
+    answers = sum(d["answers"] for d in by_difficulty.values())
+    correct = sum(d["correct"] for d in by_difficulty.values())
+    return {
+        "trivia_id": trivia_id,
+        "completions": completions,
+        "average_score": round(total_score / completions, 2) if completions else None,
+        "answers": answers,
+        "correct": correct,
+        "accuracy": _accuracy(correct, answers),
+        "by_difficulty": by_difficulty
+    }
+
+
+def _ranked_ahead(score, user_id):
+    """Leaderboard entries ranked at or above ``(score, user_id)``."""
+    # The range on total_score lets SQLite seek in ix_user_stats_leaderboard
+    return db.and_(UserStats.total_score >= score,
+                   db.or_(UserStats.total_score > score, UserStats.user_id <= user_id))
+
+
+def leaderboard_page(limit, after=None):
+    """A page of the all-time leaderboard and the cursor of the next one (or ``None``).
+
+    Players are ordered by total points, ties by user id. ``after`` is a
+    cursor returned with the previous page; a malformed one raises
+    ``ValueError``.
+    """
+    stmt = (
+        db.select(UserStats.user_id, User.name, UserStats.total_score, UserStats.completions)
+        .join(User, User.id == UserStats.user_id)
+        .order_by(UserStats.total_score.desc(), UserStats.user_id)
+        .limit(limit)
+    )
+    ahead = 0
+    if after is not None:
+        score, user_id = (int(part) for part in after.split(':'))
+        stmt = stmt.where(UserStats.total_score <= score,
+                          db.or_(UserStats.total_score < score, UserStats.user_id > user_id))
+        ahead = db.session.scalar(
+            db.select(db.func.count()).select_from(UserStats).where(_ranked_ahead(score, user_id)))
+
+    rows = db.session.execute(stmt).all()
+    entries = [
+        {"rank": ahead + position, "user_id": user_id, "user": name, "score": score, "completions": completions}
+        for position, (user_id, name, score, completions) in enumerate(rows, start=1)
+    ]
+    next_cursor = f"{rows[-1].total_score}:{rows[-1].user_id}" if rows and len(rows) == limit else None
+    return entries, next_cursor
+
+
+def player_profile(user):
+    stats = db.session.get(UserStats, user.id)
+    completions, total_score = (stats.completions, stats.total_score) if stats else (0, 0)
+    rank = None
+    if stats is not None:
+        rank = db.session.scalar(
+            db.select(db.func.count()).select_from(UserStats).where(_ranked_ahead(total_score, user.id)))
+    by_difficulty = {
+        row.difficulty.name: {"answers": row.answers, "correct": row.correct,
+                              "accuracy": _accuracy(row.correct, row.answers)}
+        for row in db.session.scalars(
+            db.select(UserDifficultyStats).where(UserDifficultyStats.user_id == user.id))
+    }
+    answers = sum(d["answers"] for d in by_difficulty.values())
+    correct = sum(d["correct"] for d in by_difficulty.values())
+    return {
+        "user_id": user.id,
+        "user": user.name,
+        "completions": completions,
+        "total_score": total_score,
+        "rank": rank,
+        "answers": answers,
+        "correct": correct,
+        "accuracy": _accuracy(correct, answers),
+        "by_difficulty": by_difficulty
+    }
+
+
+def backfill():
+    """Rebuild every aggregate from ``user_answers`` and ``trivia_participations``.
+
+    Runs in one transaction: the tables are emptied first, which takes the
+    write lock, so submits wait instead of being counted twice or lost.
+    """
+    for model in (QuestionStats, OptionStats, TriviaStats, TriviaDifficultyStats):
+        db.session.execute(db.delete(model))
+
+    aggregates = Aggregates()
+    answers = db.session.execute(
+        db.select(TriviaParticipation.trivia_id, UserAnswer.question_id, UserAnswer.selected_option_id,
+                  UserAnswer.is_correct, Question.difficulty)
+        .join(TriviaParticipation, TriviaParticipation.id == UserAnswer.participation_id)
+        .join(Question, Question.id == UserAnswer.question_id)
+        .execution_options(yield_per=current_app.config['STREAM_YIELD_PER'])
+    )
+    count = 0
+    for trivia_id, question_id, option_id, is_correct, difficulty in answers:
+        aggregates.add_answer(trivia_id, question_id, option_id, bool(is_correct), difficulty)
+        count += 1
+
+    for trivia_id, completions, score in db.session.execute(
+        db.select(TriviaParticipation.trivia_id, db.func.count(), db.func.coalesce(db.func.sum(TriviaParticipation.score), 0))
+        .where(TriviaParticipation.completed == True)
+        .group_by(TriviaParticipation.trivia_id)
+    ):
+        aggregates.add_completions(trivia_id, completions, score)
+
+    aggregates.save()
+    db.session.commit()
+    return {"answers": count, "trivias": len(aggregates.trivia_completions),
+            "questions": len(aggregates.question_answers)}
+
+
+stats_cli = AppGroup('stats', help='Aggregated statistics.')
+
+
+@stats_cli.command('backfill')
+def backfill_command():
+    """Rebuild the statistics tables from the answer history."""
+    result = backfill()
+    click.echo(f"{result['answers']} respuestas procesadas ({result['questions']} preguntas, "
+               f"{result['trivias']} trivias)")
+
+
+@stats_cli.command('rebuild-players')
+@click.option('--chunk-size', type=int, default=None, help='User ids per transaction.')
+def rebuild_players_command(chunk_size):
+    """Recompute the leaderboard and player profiles from the history."""
+    result = rebuild_players(chunk_size or current_app.config['PLAYER_STATS_CHUNK_SIZE'])
+    click.echo(f"{result['players']} jugadores con trivias completadas ({result['users']} usuarios revisados)")
@@ -0,0 +1,84 @@
+"""Server-Sent Events for the live ranking (``GET /trivias/<id>/ranking/stream``).
+
+A stream starts with a ``snapshot`` event (top ``limit`` entries and the
+total) and then sends one ``entry`` event per completed participation that
+enters the top: the new entry takes ``rank`` and the entries at that rank or
+below move down one. Completed participations reach the stream through the
+broker, so the database is not queried per subscriber. A new ``snapshot`` is
+sent whenever the stream cannot apply deltas (the subscriber fell behind or
+the leaderboard was rebuilt); idle streams get a comment every
+``RANKING_STREAM_HEARTBEAT`` seconds.
+"""
+import bisect
+from datetime import datetime
+from flask import current_app
+from .extensions import db
+from .broker import broker
+from .cache import leaderboards
+
+
+def ranking_channel(trivia_id):
+    return f'ranking:{trivia_id}'
+
+
+def publish_completed(submission):
+    """Announce a completed participation to the ranking streams."""
+    broker.publish(ranking_channel(submission["trivia_id"]), {
+        "participation_id": submission["participation_id"],
+        "score": submission["score"],
+        "completed_at": submission["completed_at"].isoformat(),
+        "user": submission["name"],
+    })
+
+
+def apply_completed(board, message):
+    """Index a published participation and return its leaderboard key.
+
+    Indexing is a no-op when this process already did it; it is needed when
+    the submit was handled by another worker.
+    """
+    completed_at = datetime.fromisoformat(message["completed_at"])
+    board.add(message["participation_id"], message["score"], completed_at, message["user"])
+    return board.key(message["participation_id"], message["score"], completed_at)
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {current_app.json.dumps(data)}\n\n'
+
+
+def ranking_events(trivia_id, limit):
+    heartbeat = current_app.config['RANKING_STREAM_HEARTBEAT']
+    subscription = broker.subscribe(ranking_channel(trivia_id))
+    try:
+        while True:
+            board = leaderboards.get(trivia_id)
+            # Whatever is queued goes into the snapshot
+            for message in subscription.drain():
+                apply_completed(board, message)
+            entries, top, total = board.snapshot(limit)
+            # Release the connection for the (long) rest of the stream
+            db.session.close()
+            yield sse('snapshot', {"entries": entries, "total": total})
+
+            # Ranks of the deltas are computed against the top this client has
+            # seen, so applying them in order always yields the right top
+            while not subscription.lagged and leaderboards.peek(trivia_id) is board:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                key = apply_completed(board, message)
+                index = bisect.bisect_left(top, key)
+                if index >= limit or (index < len(top) and top[index] == key):
+                    continue
+                top.insert(index, key)
+                del top[limit:]
+                yield sse('entry', {
+                    "rank": index + 1,
+                    "user": message["user"],
+                    "score": message["score"],
+                    "completed_at": key[1]
+                })
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,225 @@
+"""Persistence of trivia submissions, optionally with write-behind group commit.
+
+By default every submission is written in its own transaction by the request
+that scored it. With ``SUBMIT_WRITE_BEHIND`` the request only enqueues the
+scored submission in a bounded queue and a writer thread flushes up to
+``SUBMIT_BATCH_SIZE`` of them per transaction (one bulk insert of answers and
+one bulk update of participations), so a burst of submits costs a handful of
+commits instead of one each.
+
+``SUBMIT_DURABILITY`` picks what the request waits for:
+
+- ``commit``: the response is sent once the batch holding the submission has
+  committed (group commit, nothing acknowledged is lost). If that takes more
+  than ``SUBMIT_COMMIT_TIMEOUT`` seconds :class:`CommitPending` is raised:
+  the submission stays queued and is still written (202).
+- ``async``: the response is sent as soon as the submission is queued; it is
+  written shortly after and on shutdown the queue is drained, but a crash can
+  lose what was still queued.
+
+If the queue is full the submit fails fast with :class:`Overloaded` (503).
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from flask import current_app
+from .extensions import db
+from .models import TriviaParticipation, UserAnswer
+from .cache import assignments, leaderboards
+from .hashing import Overloaded
+from .streams import publish_completed
+from .stats import record_submissions
+from .response_cache import response_cache
+
+DURABILITY_MODES = ('commit', 'async')
+
+# Claims the participation: only one submission can flip completed to true,
+# however many requests (or workers) race on it
+COMPLETE_PARTICIPATION = (
+    db.update(TriviaParticipation.__table__)
+    .where(TriviaParticipation.id == db.bindparam('p_id'), TriviaParticipation.completed == False)
+    .values(score=db.bindparam('p_score'), completed=True, completed_at=db.bindparam('p_completed_at'))
+)
+
+
+class CommitPending(Exception):
+    """The submission is queued but its batch did not commit within ``SUBMIT_COMMIT_TIMEOUT``."""
+
+
+def save_submissions(submissions):
+    """Write ``submissions`` and their aggregates in one transaction, then
+    update the in-memory indexes.
+
+    Each submission is a dict with ``participation_id``, ``trivia_id``,
+    ``user_id``, ``name``, ``score``, ``completed_at`` and ``answers`` (rows
+    for ``UserAnswer``). A submission whose participation is already
+    completed is dropped; returns the submissions that were saved.
+    """
+    # One conditional UPDATE per submission (an executemany only reports the
+    # total rowcount); the write lock is taken by the first one
+    saved = [
+        s for s in submissions
+        if db.session.execute(COMPLETE_PARTICIPATION, {
+            "p_id": s["participation_id"], "p_score": s["score"], "p_completed_at": s["completed_at"]
+        }).rowcount == 1
+    ]
+    answers = [answer for submission in saved for answer in submission["answers"]]
+    if answers:
+        db.session.execute(db.insert(UserAnswer), answers)
+    record_submissions(saved)
+    db.session.commit()
+
+    assignments.invalidate(*{s["user_id"] for s in submissions})
+    # Keep the leaderboard index in sync; if it is not built yet, make sure a
+    # build that started before this commit is not stored
+    for s in saved:
+        board = leaderboards.peek(s["trivia_id"])
+        if board is not None:
+            board.add(s["participation_id"], s["score"], s["completed_at"], s["name"])
+        else:
+            leaderboards.invalidate(s["trivia_id"])
+        publish_completed(s)
+    # The other worker processes rebuild their copies
+    leaderboards.notify(*{s["trivia_id"] for s in saved})
+    response_cache.bump(*{f'ranking:{s["trivia_id"]}' for s in saved})
+    return saved
+
+
+class SubmissionWriter:
+    """Saves submissions inline or through a batching writer thread."""
+
+    def init_app(self, app):
+        if app.config['SUBMIT_DURABILITY'] not in DURABILITY_MODES:
+            raise ValueError(f"SUBMIT_DURABILITY must be one of {DURABILITY_MODES}")
+        app.extensions['submission_writer'] = {
+            'app': app,
+            'queue': None,
+            'thread': None,
+            'pid': None,
+            'pending': set(),
+            'lock': threading.Lock(),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['submission_writer']
+
+    def is_pending(self, participation_id):
+        """Whether the submission is queued but not yet committed."""
+        return participation_id in self._state['pending']
+
+    def save(self, submission):
+        """Persist ``submission`` according to the configured mode.
+
+        Returns False if the participation had already been completed. In
+        ``async`` mode that is not known yet and True is returned; the
+        duplicate is dropped when the batch is written. Raises
+        :class:`CommitPending` in ``commit`` mode if the batch is slow.
+        """
+        config = current_app.config
+        if not config['SUBMIT_WRITE_BEHIND']:
+            return bool(save_submissions([submission]))
+
+        # Hand the connection back first: the writer thread needs it (the
+        # production profile has a single writer connection)
+        db.session.close()
+        state = self._state
+        future = Future()
+        with state['lock']:
+            self._ensure_writer(state)
+            try:
+                state['queue'].put_nowait((submission, future))
+            except queue.Full:
+                raise Overloaded(config['SUBMIT_RETRY_AFTER'])
+            state['pending'].add(submission["participation_id"])
+
+        if config['SUBMIT_DURABILITY'] == 'commit':
+            try:
+                return future.result(timeout=config['SUBMIT_COMMIT_TIMEOUT'])
+            except FuturesTimeoutError:
+                # Not a failure: the writer still has it and will save it
+                raise CommitPending() from None
+        return True
+
+    def drain(self):
+        """Flush everything queued and stop the writer thread of this process."""
+        self._stop(self._state)
+
+    def _ensure_writer(self, state):
+        # The thread is started lazily and once per process: a thread (and its
+        # queue locks) inherited through fork() is unusable in the child
+        if state['thread'] is not None and state['pid'] == os.getpid():
+            return
+        app = state['app']
+        state['queue'] = queue.Queue(maxsize=app.config['SUBMIT_QUEUE_SIZE'])
+        state['pending'] = set()
+        state['pid'] = os.getpid()
+        state['thread'] = threading.Thread(
+            target=self._run, args=(app, state['queue']), name='talatrivia-submit-writer', daemon=True)
+        state['thread'].start()
+        atexit.register(self._stop, state)
+
+    def _stop(self, state):
+        with state['lock']:
+            thread = state['thread']
+            if thread is None or state['pid'] != os.getpid():
+                return
+            state['thread'] = None
+        state['queue'].put(None)
+        thread.join()
+
+    def _run(self, app, submissions):
+        batch_size = app.config['SUBMIT_BATCH_SIZE']
+        linger = app.config['SUBMIT_FLUSH_INTERVAL']
+        with app.app_context():
+            stopping = False
+            while not stopping:
+                item = submissions.get()
+                if item is None:
+                    break
+                batch = [item]
+                # Group whatever arrives within the flush interval, up to a batch
+                deadline = time.monotonic() + linger
+                while len(batch) < batch_size:
+                    try:
+                        item = submissions.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._flush(app, batch)
+
+    def _flush(self, app, batch):
+        state = app.extensions['submission_writer']
+        # Duplicates of one participation may share a batch: match by identity
+        try:
+            saved = {id(s) for s in save_submissions([submission for submission, _ in batch])}
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Write-behind batch of %d submissions failed, retrying one by one", len(batch))
+            # Isolate the submission(s) that make the batch fail
+            for submission, future in batch:
+                try:
+                    saved = save_submissions([submission])
+                except Exception as exc:
+                    db.session.rollback()
+                    app.logger.exception("Submission of participation %s was not saved",
+                                         submission["participation_id"])
+                    future.set_exception(exc)
+                else:
+                    future.set_result(bool(saved))
+        else:
+            for submission, future in batch:
+                future.set_result(id(submission) in saved)
+        finally:
+            db.session.remove()
+            with state['lock']:
+                state['pending'].difference_update(s["participation_id"] for s, _ in batch)
+
+
+submission_writer = SubmissionWriter()
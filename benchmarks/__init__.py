@@ -0,0 +1,5 @@
+"""Benchmarks for TalaTrivia.
+
+Each module is runnable with ``python -m benchmarks.<name>`` and prints its
+results as JSON so runs can be compared between commits.
+"""
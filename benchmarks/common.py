@@ -0,0 +1,28 @@
+import statistics
+import time
+
+from app import create_app
+from app.config import Config
+
+
+def make_app(database_uri, **overrides):
+    """Create the app against ``database_uri`` with config ``overrides``."""
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        **overrides,
+    })
+    return create_app(config)
+
+
+def timeit(fn, repeat):
+    """Run ``fn`` ``repeat`` times and return timing stats in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
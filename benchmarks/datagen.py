@@ -0,0 +1,141 @@
+"""Synthetic data at scale, written with bulk inserts.
+
+    python -m benchmarks.datagen --database sqlite:////tmp/talatrivia_bench.db \\
+        --users 10000 --questions 2000 --trivias 20 --players-per-trivia 2000
+
+Every player gets the password ``123456`` (hashed once) and the admin is
+``admin@talana.com`` / ``admin123``, like ``seed.py``.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+from app.cache import POINTS
+from app.extensions import db
+from app.stats import backfill as backfill_stats, rebuild_players
+from app.models import (User, Question, Option, Trivia, TriviaQuestion, TriviaParticipation,
+                        UserAnswer, Difficulty, UserRole)
+from benchmarks.common import make_app
+
+PLAYER_PASSWORD = "123456"
+OPTIONS_PER_QUESTION = 4
+CHUNK_SIZE = 10_000
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(db.insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def generate(users=1000, questions=500, trivias=5, questions_per_trivia=10,
+             players_per_trivia=500, completed_ratio=0.5, seed=42):
+    """Drop and recreate the schema, then fill it. Must run in an app context.
+
+    Returns a summary with the player emails that still have pending trivias.
+    """
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+
+    player_hash = generate_password_hash(PLAYER_PASSWORD)
+    _insert(User, [{"name": "Admin Talana", "email": "admin@talana.com", "role": UserRole.ADMIN,
+                    "password_hash": generate_password_hash("admin123")}] + [
+        {"name": f"Jugador {i}", "email": f"jugador{i}@talana.com", "role": UserRole.PLAYER,
+         "password_hash": player_hash}
+        for i in range(1, users + 1)
+    ])
+    player_ids = list(range(2, users + 2))
+
+    difficulties = list(Difficulty)
+    question_difficulty = {q_id: difficulties[q_id % 3] for q_id in range(1, questions + 1)}
+    _insert(Question, [
+        {"id": q_id, "text": f"¿Pregunta {q_id}?", "difficulty": difficulty}
+        for q_id, difficulty in question_difficulty.items()
+    ])
+    # Option ids are sequential: the first option of each question is the correct one
+    _insert(Option, [
+        {"question_id": q_id, "text": f"Opción {n}", "is_correct": n == 0}
+        for q_id in question_difficulty for n in range(OPTIONS_PER_QUESTION)
+    ])
+
+    _insert(Trivia, [{"id": t_id, "name": f"Trivia {t_id}", "description": "Benchmark"}
+                     for t_id in range(1, trivias + 1)])
+
+    trivia_questions = {
+        t_id: rng.sample(range(1, questions + 1), min(questions_per_trivia, questions))
+        for t_id in range(1, trivias + 1)
+    }
+    _insert(TriviaQuestion, [{"trivia_id": t_id, "question_id": q_id}
+                             for t_id, q_ids in trivia_questions.items() for q_id in q_ids])
+
+    participations, answers = [], []
+    pending_users = set()
+    now = datetime.utcnow()
+    participation_id = 0
+    for t_id, q_ids in trivia_questions.items():
+        for u_id in rng.sample(player_ids, min(players_per_trivia, len(player_ids))):
+            participation_id += 1
+            completed = rng.random() < completed_ratio
+            score = 0
+            if completed:
+                for q_id in q_ids:
+                    pick = rng.randrange(OPTIONS_PER_QUESTION)
+                    points = POINTS[question_difficulty[q_id]] if pick == 0 else 0
+                    score += points
+                    answers.append({
+                        "participation_id": participation_id, "question_id": q_id,
+                        "selected_option_id": (q_id - 1) * OPTIONS_PER_QUESTION + pick + 1,
+                        "is_correct": pick == 0, "points_awarded": points,
+                    })
+            else:
+                pending_users.add(u_id)
+            participations.append({
+                "id": participation_id, "trivia_id": t_id, "user_id": u_id,
+                "score": score, "completed": completed, "started_at": now,
+                "completed_at": now + timedelta(seconds=rng.randint(1, 3600)) if completed else None,
+            })
+    _insert(TriviaParticipation, participations)
+    _insert(UserAnswer, answers)
+    db.session.commit()
+    backfill_stats()
+    rebuild_players(current_app.config['PLAYER_STATS_CHUNK_SIZE'])
+
+    return {
+        "users": users,
+        "questions": questions,
+        "trivias": trivias,
+        "participations": len(participations),
+        "answers": len(answers),
+        "pending_players": [f"jugador{u_id - 1}@talana.com" for u_id in sorted(pending_users)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", required=True, help="SQLAlchemy URL of the database to (re)create")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--trivias", type=int, default=5)
+    parser.add_argument("--questions-per-trivia", type=int, default=10)
+    parser.add_argument("--players-per-trivia", type=int, default=500)
+    parser.add_argument("--completed-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    app = make_app(args.database)
+    t0 = time.perf_counter()
+    with app.app_context():
+        summary = generate(args.users, args.questions, args.trivias, args.questions_per_trivia,
+                           args.players_per_trivia, args.completed_ratio, args.seed)
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    summary["pending_players"] = len(summary["pending_players"])
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
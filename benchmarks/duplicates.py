@@ -0,0 +1,155 @@
+"""Hammer the same submission from many threads and check it is scored once.
+
+    python -m benchmarks.duplicates --threads 32 --rounds 20
+
+Two app instances share one SQLite file (the production profile), standing in
+for two workers: each has its own in-memory caches, pending set and
+idempotency store, so only the atomic completion check in the database can
+stop the second one. Every round picks a fresh participation and sends the
+same POST /submit from ``--threads`` threads at once, with and without a
+shared ``Idempotency-Key``, in each submission mode. Afterwards the database
+must hold one completion, one answer per question and the expected score.
+Only one request per round should get a fresh 200, except in async mode,
+which acknowledges before writing (the duplicates are dropped by the writer),
+and in commit-timeout mode, where no batch commits within
+``SUBMIT_COMMIT_TIMEOUT``: every acknowledgement must be a 202 for a
+submission that is still saved. No request may fail with a 5xx. The process
+exits with status 1 when a check fails, so it can be used as a regression
+check.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+from flask_jwt_extended import create_access_token
+
+from app.cache import answer_keys
+from app.config import ProductionConfig
+from app.extensions import db
+from app.models import TriviaParticipation, TriviaQuestion, UserAnswer, TriviaStats
+from app.submissions import submission_writer
+from benchmarks.common import make_app
+from benchmarks.datagen import OPTIONS_PER_QUESTION, generate
+from benchmarks.submissions import MODES, PROFILE_KEYS
+
+VARIANTS = ("same-key", "no-key")
+# The benchmark modes, plus commit mode with batches that linger past the commit timeout
+CHECK_MODES = {
+    **MODES,
+    "write-behind-commit-timeout": {**MODES["write-behind-commit"], "SUBMIT_COMMIT_TIMEOUT": 0.01,
+                                    "SUBMIT_FLUSH_INTERVAL": 0.2},
+}
+
+
+def hammer(apps, path, body, headers, threads):
+    barrier = threading.Barrier(threads)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def task(index):
+        client = apps[index % len(apps)].test_client()
+        barrier.wait()
+        response = client.post(path, json=body, headers=headers)
+        replayed = response.headers.get('Idempotent-Replayed') == 'true'
+        with lock:
+            statuses[f"{response.status_code}{' replayed' if replayed else ''}"] += 1
+
+    workers = [threading.Thread(target=task, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return statuses
+
+
+def check(app, participation_id, questions, expected_score):
+    """Whether the participation was completed once, with one answer per question."""
+    with app.app_context():
+        participation = db.session.get(TriviaParticipation, participation_id)
+        answers = db.session.scalar(
+            db.select(db.func.count()).select_from(UserAnswer).where(UserAnswer.participation_id == participation_id))
+        db.session.remove()
+        return participation.completed and participation.score == expected_score and answers == questions
+
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        config = {**{key: getattr(ProductionConfig, key) for key in PROFILE_KEYS}, **CHECK_MODES[mode]}
+        apps = [make_app(uri, **config) for _ in range(2)]
+        with apps[0].app_context():
+            generate(users=args.rounds, questions=args.questions, trivias=1,
+                     questions_per_trivia=args.questions_per_trivia, players_per_trivia=args.rounds,
+                     completed_ratio=0.0, seed=args.seed)
+            # The first option of each generated question is the correct one
+            answers = [
+                {"question_id": q_id, "option_id": (q_id - 1) * OPTIONS_PER_QUESTION + 1}
+                for q_id in db.session.scalars(db.select(TriviaQuestion.question_id))
+            ]
+            answer_key = answer_keys.get(1)
+            expected_score = sum(answer_key[answer["question_id"]][0] for answer in answers)
+            participations = db.session.execute(
+                db.select(TriviaParticipation.id, TriviaParticipation.user_id).order_by(TriviaParticipation.id)
+            ).all()
+            tokens = {user_id: create_access_token(identity=str(user_id)) for _, user_id in participations}
+            db.session.remove()
+
+        # A repeated answer in the body must not be scored twice either
+        body = {"answers": answers + answers[:1]}
+        results = {variant: {"rounds": 0, "scored_once": 0, "statuses": Counter()} for variant in VARIANTS}
+        for round_, (participation_id, user_id) in enumerate(participations):
+            variant = VARIANTS[round_ % len(VARIANTS)]
+            headers = {"Authorization": f"Bearer {tokens[user_id]}"}
+            if variant == "same-key":
+                headers["Idempotency-Key"] = f"round-{round_}"
+            statuses = hammer(apps, "/trivias/1/submit", body, headers, args.threads)
+
+            # Async mode acknowledges before writing: wait for both writers
+            for app in apps:
+                with app.app_context():
+                    submission_writer.drain()
+            result = results[variant]
+            result["rounds"] += 1
+            result["statuses"].update(statuses)
+            result["scored_once"] += check(apps[0], participation_id, len(answers), expected_score)
+
+        with apps[0].app_context():
+            completions = db.session.get(TriviaStats, 1).completions
+        ok = completions == len(participations)
+        for result in results.values():
+            statuses = result["statuses"]
+            ok = ok and result["scored_once"] == result["rounds"]
+            ok = ok and not any(status.startswith("5") for status in statuses)
+            # Each instance may acknowledge its own copy as pending before the writer drops it
+            if mode == "write-behind-commit-timeout":
+                ok = ok and "200" not in statuses and statuses.get("202", 0) >= result["rounds"]
+            # Async mode may acknowledge several copies before the writer drops them
+            elif CHECK_MODES[mode].get("SUBMIT_DURABILITY") != "async":
+                ok = ok and statuses.get("200", 0) == result["rounds"]
+            result["statuses"] = dict(statuses)
+        return {**results, "completions": completions, "participations": len(participations), "ok": ok}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--questions-per-trivia", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=CHECK_MODES, action="append",
+                        help="submission mode (repeatable, default: all)")
+    args = parser.parse_args()
+
+    modes = args.mode or list(CHECK_MODES)
+    report = {mode: run_mode(mode, args) for mode in modes}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(result["ok"] for result in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Memory and throughput of GET /trivias/<id>/export at growing sizes.
+
+    python -m benchmarks.export --players 10000 --players 100000
+
+For each ``--players`` value the data is regenerated with benchmarks.datagen
+(one trivia, every participation completed, ``--questions-per-trivia``
+answers each) and the export is consumed chunk by chunk through the Flask
+test client in every format, with and without gzip. ``peak_mb`` is the
+tracemalloc peak of a second pass: it should stay flat as the answers grow.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import make_app
+from benchmarks.datagen import generate
+
+VARIANTS = (
+    ("csv", False),
+    ("csv", True),
+    ("ndjson", False),
+    ("ndjson", True),
+)
+
+
+def consume(client, fmt, gzip):
+    headers = {"Accept-Encoding": "gzip"} if gzip else {"Accept-Encoding": "identity"}
+    response = client.get(f"/trivias/1/export?format={fmt}", headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return response.status_code, size
+
+
+def measure(client, fmt, gzip):
+    # Timed and traced in separate passes: tracemalloc slows the stream down
+    t0 = time.perf_counter()
+    status, size = consume(client, fmt, gzip)
+    duration = time.perf_counter() - t0
+
+    tracemalloc.start()
+    consume(client, fmt, gzip)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "status": status,
+        "bytes": size,
+        "duration_s": round(duration, 3),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run_size(players, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            summary = generate(users=players, questions=args.questions, trivias=1,
+                               questions_per_trivia=args.questions_per_trivia,
+                               players_per_trivia=players, completed_ratio=1.0, seed=args.seed)
+        client = app.test_client()
+        results = {
+            f"{fmt}{'+gzip' if gzip else ''}": measure(client, fmt, gzip) for fmt, gzip in VARIANTS
+        }
+    return {"answers": summary["answers"], "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, action="append",
+                        help="participations of the exported trivia (repeatable, default: 10000 and 50000)")
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--questions-per-trivia", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = args.players or [10000, 50000]
+    print(json.dumps({str(players): run_size(players, args) for players in sizes}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cold-start import budget, measured with ``python -X importtime``.
+
+    python -m benchmarks.importtime --repeat 5
+
+Each scenario runs in a fresh interpreter ``--repeat`` times; the best run's
+total import time (the sum of the top-level cumulative times) must stay under
+the scenario's budget (or ``--budget-ms``) and none of its deferred modules
+may be imported. The process exits with status 1 when a scenario breaks its
+budget, so it can be used as a regression check. The top ``--top`` app and third-party imports
+of the best run are reported to show where the time goes.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Loaded on first use (serializers.get_schema) or by the `flask` CLI only
+SERIALIZATION = ("app.schemas", "marshmallow", "flask_marshmallow", "marshmallow_sqlalchemy")
+MIGRATIONS = ("flask_migrate", "alembic")
+
+SCENARIOS = {
+    # The web server, seed.py and the benchmarks: create_app() outside the CLI
+    "create_app": {
+        "argv": ["-c", "from app import create_app; create_app()"],
+        "budget_ms": 900,
+        "deferred": SERIALIZATION + MIGRATIONS,
+    },
+    # Migrations load the app through the CLI and need Flask-Migrate, not the schemas
+    "flask db": {
+        "argv": ["-m", "flask", "--app", "run.py", "db", "heads"],
+        "budget_ms": 1100,
+        "deferred": SERIALIZATION,
+    },
+}
+
+
+def parse_importtime(stderr):
+    """Return ``{module: (self_us, cumulative_us, depth)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure(argv, env):
+    result = subprocess.run([sys.executable, "-X", "importtime", *argv], env=env,
+                            capture_output=True, text=True, check=True)
+    modules = parse_importtime(result.stderr)
+    total_us = sum(cumulative for _, cumulative, depth in modules.values() if depth == 0)
+    return total_us, modules
+
+
+def run_scenario(scenario, args, env):
+    budget_ms = args.budget_ms or scenario["budget_ms"]
+    total_us, modules = min((measure(scenario["argv"], env) for _ in range(args.repeat)),
+                            key=lambda run: run[0])
+    deferred = sorted(name for name in modules if name.split(".")[0] in scenario["deferred"]
+                      or name in scenario["deferred"])
+    top = sorted(((name, cumulative) for name, (_, cumulative, depth) in modules.items()
+                  if depth <= 1 and not name.startswith(("_", "encodings"))),
+                 key=lambda item: item[1], reverse=True)[:args.top]
+    return {
+        "budget_ms": budget_ms,
+        "import_ms": round(total_us / 1000, 1),
+        "modules": len(modules),
+        "deferred_imported": deferred,
+        "top_ms": {name: round(cumulative / 1000, 1) for name, cumulative in top},
+        "ok": total_us / 1000 <= budget_ms and not deferred,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float,
+                        help="maximum total import time, for every scenario (default: per scenario)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (the best one counts)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append",
+                        help="scenario to run (repeatable, default: all)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+        report = {name: run_scenario(SCENARIOS[name], args, env) for name in args.scenario or SCENARIOS}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(result["ok"] for result in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
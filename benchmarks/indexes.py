@@ -0,0 +1,144 @@
+"""Query plans and latency of the hot lookup paths, with and without indexes.
+
+    python -m benchmarks.indexes --participations 100000
+
+The schema comes from ``app.models``. The "before" numbers run the same
+queries with ``NOT INDEXED`` so SQLite can only use the primary keys, as it
+did before the composite indexes were added.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app.extensions import db
+from app import models  # noqa: F401 (registers the tables)
+
+QUERIES = {
+    "participation_lookup": (
+        "SELECT id, completed, score FROM trivia_participations {hint} "
+        "WHERE trivia_id = :trivia_id AND user_id = :user_id"
+    ),
+    "my_trivias": (
+        "SELECT id, trivia_id, score, completed FROM trivia_participations {hint} "
+        "WHERE user_id = :user_id"
+    ),
+    "ranking": (
+        "SELECT p.id, p.score, p.completed_at, u.name FROM trivia_participations AS p {hint} "
+        "JOIN users AS u ON u.id = p.user_id "
+        "WHERE p.trivia_id = :trivia_id AND p.completed = 1 "
+        "ORDER BY p.score DESC, p.completed_at"
+    ),
+    "answers_by_participation": (
+        "SELECT question_id, selected_option_id, is_correct FROM user_answers {hint} "
+        "WHERE participation_id = :participation_id"
+    ),
+}
+
+
+def populate(path, participations, users, answers_per_participation):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    trivias = max(1, participations // users)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executemany(
+        "INSERT INTO users (id, name, email, role) VALUES (?, ?, ?, 'PLAYER')",
+        ((i, f"Jugador {i}", f"jugador{i}@talana.com") for i in range(1, users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO trivias (id, name) VALUES (?, ?)",
+        ((i, f"Trivia {i}") for i in range(1, trivias + 1)),
+    )
+
+    rng = random.Random(42)
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(participations):
+        completed = rng.random() < 0.6
+        rows.append((
+            i + 1, i % users + 1, i // users + 1,
+            rng.randint(0, 30) if completed else 0, completed,
+            start + timedelta(seconds=rng.randint(0, 86400)) if completed else None,
+        ))
+    conn.executemany(
+        "INSERT INTO trivia_participations (id, user_id, trivia_id, score, completed, completed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)", rows,
+    )
+    conn.executemany(
+        "INSERT INTO user_answers (participation_id, question_id, selected_option_id, is_correct, points_awarded) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ((p, q, q * 4, q % 2, q % 3) for p in range(1, participations + 1)
+         for q in range(1, answers_per_participation + 1)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return trivias
+
+
+def measure(conn, sql, params_list, repeat):
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params_list[0])]
+    timings = []
+    for _ in range(repeat):
+        for params in params_list:
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1e6)
+    return {
+        "plan": plan,
+        "p50_us": round(statistics.median(timings), 1),
+        "mean_us": round(statistics.fmean(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participations", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--answers", type=int, default=5, help="answers per participation")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        trivias = populate(path, args.participations, args.users, args.answers)
+        rng = random.Random(7)
+        params = {
+            "participation_lookup": [{"trivia_id": rng.randint(1, trivias), "user_id": rng.randint(1, args.users)}
+                                     for _ in range(args.samples)],
+            "my_trivias": [{"user_id": rng.randint(1, args.users)} for _ in range(args.samples)],
+            "ranking": [{"trivia_id": rng.randint(1, trivias)} for _ in range(args.samples)],
+            "answers_by_participation": [{"participation_id": rng.randint(1, args.participations)}
+                                         for _ in range(args.samples)],
+        }
+
+        conn = sqlite3.connect(path)
+        results = {}
+        for name, sql in QUERIES.items():
+            results[name] = {
+                "before": measure(conn, sql.format(hint="NOT INDEXED"), params[name], args.repeat),
+                "after": measure(conn, sql.format(hint=""), params[name], args.repeat),
+            }
+        conn.close()
+
+    print(json.dumps({
+        "participations": args.participations,
+        "users": args.users,
+        "trivias": trivias,
+        "queries": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Load driver for the player journey.
+
+Each journey logs in as a player with a pending trivia and then runs
+``/my-trivias`` -> ``/play`` -> ``/submit`` -> ``/ranking``. Journeys run on
+``--workers`` concurrent threads, either in-process through the Flask test
+client or against a running server (``--url``).
+
+    # In-process, generating the data first
+    python -m benchmarks.journey --database sqlite:////tmp/talatrivia_bench.db --generate \\
+        --journeys 500 --workers 8 --output before.json
+
+    # Against a local server already seeded with benchmarks.datagen
+    python -m benchmarks.journey --url http://localhost:5000 --journeys 500 --workers 8
+
+The report has p50/p95/p99 latency (ms), errors and throughput per endpoint.
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from app.extensions import db
+from app.models import User, TriviaParticipation
+from benchmarks.common import make_app
+from benchmarks.datagen import PLAYER_PASSWORD, generate
+
+ENDPOINTS = ("login", "my_trivias", "play", "submit", "ranking")
+
+
+class TestClientTransport:
+    """Requests through the Flask test client (one client per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header("Content-Type", "application/json")
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as exc:
+            return exc.code, None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 3)
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.lock = threading.Lock()
+
+    def call(self, transport, name, method, path, body=None, token=None, expect=200):
+        t0 = time.perf_counter()
+        status, data = transport.request(method, path, body, token)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self.lock:
+            self.timings[name].append(elapsed)
+            if status != expect:
+                self.errors[name] += 1
+        return data if status == expect else None
+
+    def report(self, duration):
+        endpoints = {}
+        for name in ENDPOINTS:
+            values = sorted(self.timings[name])
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "throughput_rps": round(len(values) / duration, 2) if duration else None,
+            }
+        return endpoints
+
+
+def run_journey(transport, recorder, email, rng):
+    login = recorder.call(transport, "login", "POST", "/auth/login",
+                          {"email": email, "password": PLAYER_PASSWORD})
+    if not login:
+        return False
+    token = login["access_token"]
+
+    trivias = recorder.call(transport, "my_trivias", "GET", "/my-trivias", token=token) or []
+    pending = [t["trivia"]["id"] for t in trivias if not t["completed"]]
+    if not pending:
+        return False
+    trivia_id = pending[0]
+
+    play = recorder.call(transport, "play", "GET", f"/trivias/{trivia_id}/play", token=token)
+    if not play or "questions" not in play:
+        return False
+    answers = [{"question_id": q["id"], "option_id": rng.choice(q["options"])["id"]}
+               for q in play["questions"] if q["options"]]
+
+    recorder.call(transport, "submit", "POST", f"/trivias/{trivia_id}/submit",
+                  {"answers": answers}, token=token)
+    recorder.call(transport, "ranking", "GET", f"/trivias/{trivia_id}/ranking")
+    return True
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--database", help="SQLAlchemy URL for an in-process app (Flask test client)")
+    parser.add_argument("--generate", action="store_true", help="(re)create the data with benchmarks.datagen")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--trivias", type=int, default=5)
+    parser.add_argument("--players-per-trivia", type=int, default=1000)
+    parser.add_argument("--journeys", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        transport = HttpTransport(args.url)
+        # Without access to the database, assume every player may have a pending trivia
+        emails = [f"jugador{i}@talana.com" for i in range(1, args.users + 1)]
+    else:
+        app = make_app(args.database)
+        transport = TestClientTransport(app)
+        with app.app_context():
+            if args.generate:
+                summary = generate(users=args.users, questions=args.questions, trivias=args.trivias,
+                                   players_per_trivia=args.players_per_trivia, seed=args.seed)
+                emails = summary["pending_players"]
+            else:
+                emails = db.session.scalars(
+                    db.select(User.email).join(TriviaParticipation)
+                    .where(TriviaParticipation.completed == False).distinct()
+                ).all()
+
+    rng = random.Random(args.seed)
+    rng.shuffle(emails)
+    emails = emails[:args.journeys]
+    recorder = Recorder()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        completed = sum(pool.map(
+            lambda pair: run_journey(transport, recorder, pair[1], random.Random(pair[0])),
+            enumerate(emails)
+        ))
+    duration = time.perf_counter() - t0
+
+    report = {
+        "commit": git_commit(),
+        "target": args.url or args.database,
+        "workers": args.workers,
+        "journeys": len(emails),
+        "completed_journeys": completed,
+        "duration_s": round(duration, 3),
+        "journeys_per_s": round(completed / duration, 2) if duration else None,
+        "endpoints": recorder.report(duration),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(output + '\n')
+
+
+if __name__ == "__main__":
+    main()
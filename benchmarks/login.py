@@ -0,0 +1,95 @@
+"""Login throughput with password hashing inline vs. in the process pool.
+
+    python -m benchmarks.login --logins 200 --threads 16
+
+Runs concurrent POST /auth/login requests for each ``--workers`` value
+(0 = inline on the request thread) and once more with the login cache on.
+Reports logins/s, logins/s per hashing core and 503 responses.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import User, UserRole
+from benchmarks.common import make_app
+
+PASSWORD = "123456"
+
+
+def run(database_uri, users, args, **config):
+    app = make_app(database_uri, **config)
+    local = threading.local()
+    statuses = {}
+    lock = threading.Lock()
+
+    def login(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        email = f"jugador{i % users}@talana.com"
+        status = client.post('/auth/login', json={"email": email, "password": PASSWORD}).status_code
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    # Warm up the pool so process start-up is not measured
+    for i in range(max(1, config.get('HASH_WORKERS', 0))):
+        login(i)
+    statuses.clear()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(login, range(args.logins)))
+    duration = time.perf_counter() - t0
+
+    cores = max(1, config.get('HASH_WORKERS', 0))
+    return {
+        "logins": args.logins,
+        "statuses": statuses,
+        "duration_s": round(duration, 3),
+        "logins_per_s": round(args.logins / duration, 2),
+        "logins_per_s_per_core": round(args.logins / duration / cores, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent requests")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, action="append",
+                        help="HASH_WORKERS values to compare (default: 0, 1, 2 and the CPU count)")
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({0, 1, min(2, cpus), cpus})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = make_app(database_uri)
+        with app.app_context():
+            db.create_all()
+            password_hash = generate_password_hash(PASSWORD)
+            db.session.execute(db.insert(User), [
+                {"name": f"Jugador {i}", "email": f"jugador{i}@talana.com",
+                 "role": UserRole.PLAYER, "password_hash": password_hash}
+                for i in range(args.users)
+            ])
+            db.session.commit()
+
+        common = {"HASH_MAX_PENDING": args.threads}
+        results = {f"workers_{n}": run(database_uri, args.users, args, HASH_WORKERS=n, **common)
+                   for n in workers}
+        results[f"workers_{cpus}_login_cache"] = run(
+            database_uri, args.users, args, HASH_WORKERS=cpus, LOGIN_CACHE_TTL=300, **common)
+
+    print(json.dumps({"cpus": cpus, "threads": args.threads, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
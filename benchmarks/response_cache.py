@@ -0,0 +1,60 @@
+"""Latency of the public listings with each response cache backend.
+
+    python -m benchmarks.response_cache --questions 5000 --users 5000
+
+For every backend the listings are requested once to fill the cache and then
+``--repeat`` times; ``none`` renders every response. A request with the
+ETag of the previous response (a 304) is timed as well.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from app.extensions import db
+from benchmarks.common import make_app, timeit
+from benchmarks.serialization import populate
+
+BACKENDS = ("none", "local", "file")
+PATHS = ("/users", "/questions", "/trivias")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--trivias", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        with make_app(database_uri).app_context():
+            populate(args.questions, args.users, args.trivias)
+
+        for backend in BACKENDS:
+            app = make_app(database_uri, RESPONSE_CACHE_BACKEND=backend,
+                           RESPONSE_CACHE_FILE=os.path.join(tmp, f'{backend}.sqlite'))
+            client = app.test_client()
+            results[backend] = {}
+            for path in PATHS:
+                etag = client.get(path).headers.get("ETag")
+                results[backend][path] = {"200": timeit(lambda: client.get(path).get_data(), args.repeat)}
+                if etag:
+                    conditional = lambda: client.get(path, headers={"If-None-Match": etag})
+                    assert conditional().status_code == 304
+                    results[backend][path]["304"] = timeit(conditional, args.repeat)
+            with app.app_context():
+                db.session.remove()
+
+    print(json.dumps({
+        "questions": args.questions,
+        "users": args.users,
+        "trivias": args.trivias,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Requests per second of ``python -m app.serve`` as the worker count grows.
+
+    python -m benchmarks.scaling --workers 1 --workers 2 --workers 4 --duration 10
+
+The data is generated once with benchmarks.datagen; then, for each
+``--workers`` value, the server is started on a free port with the
+production profile and ``--clients`` processes (``--threads`` each) send
+GET /trivias/<id>/play and GET /trivias/<id>/ranking for ``--duration``
+seconds. The report includes the startup time logged by the server.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+from flask_jwt_extended import create_access_token
+
+from app.extensions import db
+from app.models import TriviaParticipation
+from benchmarks.common import make_app
+from benchmarks.datagen import generate
+from benchmarks.journey import percentile
+
+LISTENING = re.compile(r"Listening on http://[^:]+:(\d+) .* startup (\d+) ms")
+
+
+def start_server(database_uri, workers):
+    env = {**os.environ, "DATABASE_URL": database_uri, "APP_ENV": "production"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", "0"],
+        env=env, stderr=subprocess.PIPE, text=True)
+    for line in process.stderr:
+        match = LISTENING.search(line)
+        if match:
+            # Keep reading stderr so the server never blocks on a full pipe
+            threading.Thread(target=process.stderr.read, daemon=True).start()
+            return process, int(match.group(1)), int(match.group(2))
+    raise RuntimeError(f"app.serve exited with code {process.wait()}")
+
+
+def client(base_url, requests, threads, duration, seed):
+    """Send ``requests`` (path, token) from ``threads`` threads; returns (latencies, errors)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop(index):
+        rng = random.Random(seed * 1000 + index)
+        local_latencies = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            path, token = rng.choice(requests)
+            request = urllib.request.Request(base_url + path, headers={"Authorization": f"Bearer {token}"})
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                local_errors += 1
+                continue
+            local_latencies.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, errors[0]
+
+
+def run_workers(database_uri, workers, requests, args):
+    process, port, startup_ms = start_server(database_uri, workers)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        with ProcessPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(client, [base_url] * args.clients, [requests] * args.clients,
+                                    [args.threads] * args.clients, [args.duration] * args.clients,
+                                    range(args.clients)))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    latencies = sorted(value for values, _ in results for value in values)
+    return {
+        "startup_ms": startup_ms,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "rps": round(len(latencies) / args.duration, 1),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, action="append",
+                        help="server worker processes (repeatable, default: 1, 2 and 4)")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per load generator")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--trivias", type=int, default=5)
+    parser.add_argument("--players-per-trivia", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = make_app(database_uri)
+        with app.app_context():
+            generate(users=args.users, trivias=args.trivias, players_per_trivia=args.players_per_trivia,
+                     completed_ratio=0.5, seed=args.seed)
+            pending = db.session.execute(
+                db.select(TriviaParticipation.user_id, TriviaParticipation.trivia_id)
+                .where(TriviaParticipation.completed == False)
+            ).all()
+            requests = []
+            for user_id, trivia_id in pending:
+                token = create_access_token(identity=str(user_id))
+                requests.append((f"/trivias/{trivia_id}/play", token))
+                requests.append((f"/trivias/{trivia_id}/ranking", token))
+            db.session.remove()
+
+        report = {workers: run_workers(database_uri, workers, requests, args)
+                  for workers in args.workers or [1, 2, 4]}
+    print(json.dumps({"cpus": os.cpu_count(), "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Marshmallow schemas vs the compiled serializers on the listing payloads.
+
+    python -m benchmarks.serialization --questions 5000 --users 5000
+
+Both paths must produce the same bytes with the default JSON provider; the
+orjson column is only reported when orjson is installed.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from flask import jsonify
+
+from app.extensions import db
+from app.models import User, Question, Option, Trivia, Difficulty, UserRole
+from app.schemas import UserSchema, QuestionSchema, TriviaSchema
+from app.serializers import user_serializer, question_serializer, trivia_serializer
+from app.json_provider import OrjsonProvider, orjson
+from benchmarks.common import make_app, timeit
+
+
+def populate(questions, users, trivias):
+    db.create_all()
+    db.session.execute(db.insert(User), [
+        {"name": f"Jugador {i}", "email": f"jugador{i}@talana.com", "role": UserRole.PLAYER}
+        for i in range(users)
+    ])
+    db.session.execute(db.insert(Trivia), [
+        {"name": f"Trivia {i}", "description": "Legislación laboral"} for i in range(trivias)
+    ])
+    db.session.execute(db.insert(Question), [
+        {"text": f"¿Pregunta {i}?", "difficulty": list(Difficulty)[i % 3]} for i in range(questions)
+    ])
+    db.session.execute(db.insert(Option), [
+        {"question_id": q_id, "text": f"Opción {n}", "is_correct": n == 0}
+        for q_id in range(1, questions + 1) for n in range(4)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--trivias", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        listings = {
+            "users": (User, UserSchema(many=True), user_serializer),
+            "questions": (Question, QuestionSchema(many=True), question_serializer),
+            "trivias": (Trivia, TriviaSchema(many=True), trivia_serializer),
+        }
+        results = {}
+
+        with app.app_context():
+            populate(args.questions, args.users, args.trivias)
+
+            for name, (model, schema, serializer) in listings.items():
+                def with_schema():
+                    db.session.expunge_all()
+                    return jsonify(schema.dump(model.query.order_by(model.id).all())).get_data()
+
+                def compiled():
+                    stmt = serializer.select().order_by(serializer.columns[serializer.pk_index])
+                    return jsonify(serializer.dump_rows(db.session.execute(stmt).all())).get_data()
+
+                assert with_schema() == compiled(), f"{name}: compiled output differs from the schema"
+                results[name] = {
+                    "schema": timeit(with_schema, args.repeat),
+                    "compiled": timeit(compiled, args.repeat),
+                }
+
+            if orjson is not None:
+                app.json = OrjsonProvider(app)
+                for name, (model, schema, serializer) in listings.items():
+                    def compiled_orjson():
+                        stmt = serializer.select().order_by(serializer.columns[serializer.pk_index])
+                        return jsonify(serializer.dump_rows(db.session.execute(stmt).all())).get_data()
+                    results[name]["compiled_orjson"] = timeit(compiled_orjson, args.repeat)
+
+    print(json.dumps({
+        "questions": args.questions,
+        "users": args.users,
+        "trivias": args.trivias,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Concurrent play/submit throughput with the default and production SQLite profiles.
+
+    python -m benchmarks.sqlite_profile --workers 16 --submits 1000
+
+For each profile the data is regenerated with benchmarks.datagen in a fresh
+file, then ``--workers`` threads run ``--reads-per-submit`` GET /play
+requests followed by one POST /submit per pending participation. Tokens are
+minted directly so password hashing does not skew the numbers.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+
+from app.config import Config, ProductionConfig
+from app.extensions import db
+from app.models import TriviaParticipation
+from benchmarks.common import make_app
+from benchmarks.datagen import generate
+
+PROFILES = {
+    "default": Config,
+    "production": ProductionConfig,
+}
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}", **{
+            key: getattr(PROFILES[profile], key)
+            for key in ('SQLITE_PRAGMAS', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLITE_READ_WRITE_SPLIT')
+            if hasattr(PROFILES[profile], key)
+        })
+        with app.app_context():
+            generate(users=args.users, questions=args.questions, trivias=args.trivias,
+                     players_per_trivia=args.players_per_trivia, completed_ratio=0.0, seed=args.seed)
+            pending = db.session.execute(
+                db.select(TriviaParticipation.user_id, TriviaParticipation.trivia_id)
+            ).all()
+            random.Random(args.seed).shuffle(pending)
+            tasks = [(create_access_token(identity=str(user_id)), trivia_id)
+                     for user_id, trivia_id in pending[:args.submits]]
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+        local = threading.local()
+        lock = threading.Lock()
+        counts = {"requests": 0, "errors": 0}
+
+        def task(item):
+            token, trivia_id = item
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = app.test_client()
+            headers = {"Authorization": f"Bearer {token}"}
+            play = None
+            for _ in range(args.reads_per_submit):
+                response = client.get(f"/trivias/{trivia_id}/play", headers=headers)
+                play = response.get_json(silent=True) if response.status_code == 200 else None
+                with lock:
+                    counts["requests"] += 1
+                    counts["errors"] += response.status_code != 200
+            answers = [{"question_id": q["id"], "option_id": q["options"][0]["id"]}
+                       for q in (play or {}).get("questions", []) if q["options"]]
+            response = client.post(f"/trivias/{trivia_id}/submit", json={"answers": answers}, headers=headers)
+            with lock:
+                counts["requests"] += 1
+                counts["errors"] += response.status_code != 200
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(task, tasks))
+        duration = time.perf_counter() - t0
+
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+    return {
+        "submits": len(tasks),
+        "requests": counts["requests"],
+        "errors": counts["errors"],
+        "duration_s": round(duration, 3),
+        "requests_per_s": round(counts["requests"] / duration, 2),
+        "submits_per_s": round(len(tasks) / duration, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--submits", type=int, default=1000)
+    parser.add_argument("--reads-per-submit", type=int, default=3)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--trivias", type=int, default=5)
+    parser.add_argument("--players-per-trivia", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append",
+                        help="profile(s) to run (default: all)")
+    args = parser.parse_args()
+
+    results = {profile: run_profile(profile, args) for profile in (args.profile or PROFILES)}
+    print(json.dumps({"workers": args.workers, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Submits per second with per-request commits vs. write-behind group commit.
+
+    python -m benchmarks.submissions --workers 32 --submits 2000
+
+For each mode the data is regenerated with benchmarks.datagen in a fresh file
+using the production SQLite profile, then ``--workers`` threads send one
+POST /submit per pending participation (a submission storm). Tokens are
+minted directly and the answers are built from the generated data, so only
+the submit path is measured. Async mode is timed until the queue is drained.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+
+from app.config import ProductionConfig
+from app.extensions import db
+from app.models import TriviaParticipation, TriviaQuestion
+from app.submissions import submission_writer
+from benchmarks.common import make_app
+from benchmarks.datagen import OPTIONS_PER_QUESTION, generate
+
+MODES = {
+    "per-request": {"SUBMIT_WRITE_BEHIND": False},
+    "write-behind-commit": {"SUBMIT_WRITE_BEHIND": True, "SUBMIT_DURABILITY": "commit"},
+    "write-behind-async": {"SUBMIT_WRITE_BEHIND": True, "SUBMIT_DURABILITY": "async"},
+}
+PROFILE_KEYS = ('SQLITE_PRAGMAS', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLITE_READ_WRITE_SPLIT')
+
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                       **{key: getattr(ProductionConfig, key) for key in PROFILE_KEYS},
+                       SUBMIT_BATCH_SIZE=args.batch_size, SUBMIT_QUEUE_SIZE=args.submits,
+                       **MODES[mode])
+        with app.app_context():
+            generate(users=args.users, questions=args.questions, trivias=args.trivias,
+                     players_per_trivia=args.players_per_trivia, completed_ratio=0.0, seed=args.seed)
+            # The first option of each generated question is the correct one
+            answers = {}
+            for trivia_id, question_id in db.session.execute(
+                    db.select(TriviaQuestion.trivia_id, TriviaQuestion.question_id)):
+                answers.setdefault(trivia_id, []).append({
+                    "question_id": question_id,
+                    "option_id": (question_id - 1) * OPTIONS_PER_QUESTION + 1,
+                })
+            pending = db.session.execute(
+                db.select(TriviaParticipation.user_id, TriviaParticipation.trivia_id)
+            ).all()
+            random.Random(args.seed).shuffle(pending)
+            tasks = [(create_access_token(identity=str(user_id)), trivia_id)
+                     for user_id, trivia_id in pending[:args.submits]]
+            db.session.remove()
+
+        local = threading.local()
+        lock = threading.Lock()
+        counts = {"errors": 0}
+
+        def task(item):
+            token, trivia_id = item
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = app.test_client()
+            response = client.post(f"/trivias/{trivia_id}/submit", json={"answers": answers[trivia_id]},
+                                   headers={"Authorization": f"Bearer {token}"})
+            if response.status_code != 200:
+                with lock:
+                    counts["errors"] += 1
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(task, tasks))
+        acknowledged = time.perf_counter() - t0
+        with app.app_context():
+            submission_writer.drain()
+        duration = time.perf_counter() - t0
+
+        with app.app_context():
+            saved = db.session.scalar(
+                db.select(db.func.count()).where(TriviaParticipation.completed == True))
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    return {
+        "submits": len(tasks),
+        "errors": counts["errors"],
+        "saved": saved,
+        "acknowledged_s": round(acknowledged, 3),
+        "duration_s": round(duration, 3),
+        "submits_per_s": round(len(tasks) / duration, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--submits", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--trivias", type=int, default=5)
+    parser.add_argument("--players-per-trivia", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=sorted(MODES), action="append",
+                        help="mode(s) to run (default: all)")
+    args = parser.parse_args()
+
+    results = {mode: run_mode(mode, args) for mode in (args.mode or MODES)}
+    print(json.dumps({"workers": args.workers, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
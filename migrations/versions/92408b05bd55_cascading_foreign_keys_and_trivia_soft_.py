@@ -0,0 +1,60 @@
+"""cascading foreign keys and trivia soft delete
+
+Revision ID: 92408b05bd55
+Revises: c09a6d4a0256
+Create Date: 2026-10-18 21:00:03.243833
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92408b05bd55'
+down_revision = 'c09a6d4a0256'
+branch_labels = None
+depends_on = None
+
+# The original foreign keys are unnamed: the naming convention gives the
+# reflected ones a name so batch mode can drop and recreate them
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+# table: [(column, referred table)]
+FOREIGN_KEYS = {
+    'options': [('question_id', 'questions')],
+    'trivia_participations': [('trivia_id', 'trivias')],
+    'trivia_questions': [('trivia_id', 'trivias'), ('question_id', 'questions')],
+    'user_answers': [('participation_id', 'trivia_participations'), ('question_id', 'questions'),
+                     ('selected_option_id', 'options')],
+}
+
+
+def _replace_foreign_keys(ondelete):
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in foreign_keys:
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+    with op.batch_alter_table('trivias', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('user_answers', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_answers_question_id'), ['question_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_answers_selected_option_id'), ['selected_option_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_answers', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_answers_selected_option_id'))
+        batch_op.drop_index(batch_op.f('ix_user_answers_question_id'))
+
+    with op.batch_alter_table('trivias', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    _replace_foreign_keys(None)
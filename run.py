@@ -4,7 +4,6 @@ import os
 load_dotenv()
 
 from app import create_app, db
-from flask_migrate import upgrade
 
 app = create_app()
 
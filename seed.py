@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import User, Question, Option, Trivia, TriviaQuestion, TriviaParticipation, UserAnswer, Difficulty, UserRole
+from app.stats import backfill as backfill_stats, rebuild_players
 from werkzeug.security import generate_password_hash
 import random
 from datetime import datetime, timedelta
@@ -181,6 +182,10 @@ def seed_database():
         # Player 3 has not played yet (Pending)
 
         db.session.commit()
+
+        # The simulated answers were inserted directly: build their statistics
+        backfill_stats()
+        rebuild_players(app.config['PLAYER_STATS_CHUNK_SIZE'])
         print("Database seeded successfully!")
         print(f"Created {len(players)} players and 1 admin.")
         print(f"Created {len(created_questions)} questions.")